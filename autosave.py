@@ -0,0 +1,208 @@
+'''
+Mine Sweeper -- autosave.py
+Copyright(c) 2024 Liu One  All rights reserved.
+
+游戏进度的后台自动保存，详情参见AutoSaver。
+存档为紧凑的JSON文本：雷的分布只保存一次，格子状态保存为字符串，
+撤销历史只保存相邻两步之间变化的格子。写入时先写临时文件再重命名，
+程序中途崩溃也不会留下损坏的存档。
+'''
+
+import os
+import json
+import queue
+import pathlib
+import tempfile
+import threading
+
+SESSION_PATH = pathlib.Path.home() / '.minesweeper' / 'autosave.json'
+SESSION_VERSION = 1
+
+MINE_CODES = '012345678'  # 格子周围雷的数量，雷记为x
+STATE_CODES = {-1: '.', 0: 'o', 1: 'f', 2: 'w'}  # 格子状态
+STATE_VALUES = {code: state for state, code in STATE_CODES.items()}
+
+
+def grid_mines(grid):
+    '''将格子矩阵中雷的分布编码为字符串。'''
+    return ''.join(
+        'x' if block_mine == -1 else MINE_CODES[block_mine]
+        for line in grid for block_mine, _ in line)
+
+
+def grid_states(grid):
+    '''将格子矩阵的状态编码为字符串。'''
+    return ''.join(
+        STATE_CODES[block_state]
+        for line in grid for _, block_state in line)
+
+
+def state_changes(states, other):
+    '''返回从状态字符串states到other变化的格子，形如[[下标, 状态], ...]。'''
+    return [
+        [index, code] for index, (old, code) in enumerate(zip(states, other))
+        if old != code]
+
+
+def encode_session(width, height, mine_sum, grid, history, cache=None):
+    '''
+    将游戏进度编码为JSON文本。
+       grid :: 当前的格子矩阵。
+    history :: 撤销历史，即Application.recent_grids。
+               只保留末尾与当前棋盘一致的部分，其它的来自之前的棋盘，无法恢复。
+      cache :: 字典，在多次调用之间缓存撤销历史中每一步的编码及与前一步的差异。
+               历史中的格子矩阵保存后不再修改，每一步只需编码一次。
+    '''
+    if cache is None:
+        cache = {}
+    entries = {}  # id(格子矩阵) -> [格子矩阵, 雷的编码, 状态的编码, 前一步, 差异]
+    for recent in history:
+        entry = cache.get(id(recent))
+        if entry is None or entry[0] is not recent:
+            entry = [recent, (len(recent), len(recent[0]) if recent else 0,
+                              grid_mines(recent)), grid_states(recent),
+                     None, None]
+        entries[id(recent)] = entry
+    cache.clear()  # 只缓存仍在历史中的步骤
+    cache.update(entries)
+    mines = grid_mines(grid)
+    kept = []
+    for recent in reversed(history):
+        if cache[id(recent)][1] != (height, width, mines):
+            break
+        kept.append(cache[id(recent)])
+    kept.reverse()
+    states = grid_states(grid)
+    changes = []
+    for previous, entry in zip(kept, kept[1:]):
+        if entry[3] is not previous[0]:  # 与前一步的差异尚未计算
+            entry[3] = previous[0]
+            entry[4] = state_changes(previous[2], entry[2])
+        changes.append(entry[4])
+    if kept:
+        changes.append(state_changes(kept[-1][2], states))
+    return json.dumps({
+        'version': SESSION_VERSION,
+        'width': width,
+        'height': height,
+        'mine_sum': mine_sum,
+        'mines': mines,
+        'states': kept[0][2] if kept else states,
+        'changes': changes,
+    }, separators=(',', ':'))
+
+
+def decode_session(text):
+    '''
+    解码encode_session()编码的JSON文本。
+    return :: 元组(宽, 高, 雷数, 格子矩阵, 撤销历史)。
+    '''
+    data = json.loads(text)
+    if data.get('version') != SESSION_VERSION:
+        raise ValueError('unknown session version')
+    width, height = data['width'], data['height']
+    mines = [-1 if code == 'x' else int(code) for code in data['mines']]
+    states = list(data['states'])
+    if len(mines) != width * height or len(states) != width * height:
+        raise ValueError('session size mismatch')
+
+    def build_grid():
+        return [[
+            [mines[i * width + j], STATE_VALUES[states[i * width + j]]]
+            for j in range(width)]
+            for i in range(height)]
+
+    grids = [build_grid()]
+    for changes in data['changes']:
+        for index, code in changes:
+            states[index] = code
+        grids.append(build_grid())
+    return width, height, data['mine_sum'], grids[-1], grids[:-1]
+
+
+def load_session(path=SESSION_PATH):
+    '''读取自动保存的游戏进度，没有或损坏时返回None。'''
+    try:
+        return decode_session(pathlib.Path(path).read_text())
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def write_atomic(path, text):
+    '''先写入同目录的临时文件，再重命名为path，保证文件总是完整的。'''
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=path.parent, prefix=path.name + '.')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+
+class AutoSaver:
+    '''
+    后台自动保存。
+    用例：
+    saver = AutoSaver()
+    saver.submit((width, height, mine_sum, grid, history))  # 立即返回
+    saver.clear()  # 游戏结束后删除存档，同样立即返回
+    saver.stop()  # 写完最后一次提交的进度后结束线程
+    编码和写入都在后台线程中进行，不会阻塞Tk的主循环。
+    后台线程忙时，新提交的进度会替换尚未写入的旧进度。
+    '''
+
+    def __init__(self, path=SESSION_PATH):
+        '''path :: 存档路径。'''
+        self.path = path
+        self.last_text = None            # 上次写入的内容，内容不变时不重复写入
+        self.cache = {}                  # 撤销历史的编码，参见encode_session()
+        self.pending = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, snapshot):
+        '''
+        提交一份进度，立即返回。
+        snapshot :: 元组(宽, 高, 雷数, 格子矩阵, 撤销历史)，提交后不能再修改。
+        '''
+        while True:
+            try:
+                self.pending.put_nowait(snapshot)
+                return
+            except queue.Full:
+                try:
+                    self.pending.get_nowait()  # 丢弃尚未写入的旧进度
+                except queue.Empty:
+                    pass
+
+    def clear(self):
+        '''删除存档，立即返回。尚未写入的进度将被丢弃。'''
+        self.submit(())
+
+    def stop(self):
+        '''写完已提交的进度并结束后台线程。'''
+        self.pending.put(None)  # 等待后台线程取走尚未写入的进度
+        self.thread.join()
+
+    def run(self):
+        '''后台线程的主循环。'''
+        while True:
+            snapshot = self.pending.get()
+            if snapshot is None:
+                return
+            try:
+                text = encode_session(
+                    *snapshot, cache=self.cache) if snapshot else ''
+                if text != self.last_text:
+                    if text:
+                        write_atomic(self.path, text)
+                    else:  # 空元组表示删除存档
+                        pathlib.Path(self.path).unlink(missing_ok=True)
+                    self.last_text = text
+            except (OSError, ValueError, KeyError, TypeError):
+                pass  # 自动保存失败不影响游戏
@@ -62,9 +62,11 @@ Double click to open a block.
 
 import sys
 import tkinter as tk
+from tkinter.messagebox import askyesno
 
 from utility import ask_settings
 from minesweeper import Application
+from autosave import load_session
 
 
 def setup_menu(root, app):
@@ -84,6 +86,21 @@ def setup_menu(root, app):
         label='Auto Mine', variable=app.auto, value=1)
     operations_menu.add_radiobutton(
         label='No Auto Mine', variable=app.auto, value=0)
+    operations_menu.add_separator()
+    operations_menu.add_radiobutton(
+        label='Show Hint', variable=app.hint, value=1,
+        command=app.GUI_show_hint)
+    operations_menu.add_radiobutton(
+        label='No Hint', variable=app.hint, value=0,
+        command=app.GUI_show_hint)
+    operations_menu.add_command(
+        label='Show Probabilities', command=app.GUI_show_probabilities,
+        accelerator='Command+P')
+    operations_menu.add_separator()
+    operations_menu.add_radiobutton(
+        label='Record Events', variable=app.record, value=1)
+    operations_menu.add_radiobutton(
+        label='No Record', variable=app.record, value=0)
     menu.add_cascade(label='Operations', menu=operations_menu)  # 操作
     help_menu = tk.Menu(menu)
     help_menu.add_command(label='Show Help', command=app.show_help)
@@ -98,6 +115,7 @@ def bind_keys(root, app):
     root.bind('<Command-r>', app.retry)
     root.bind('<Command-s>', app.save_board)
     root.bind('<Command-z>', app.GUI_undo)
+    root.bind('<Command-p>', app.GUI_show_probabilities)
 
 
 def main():
@@ -106,10 +124,17 @@ def main():
     root.title('Mine Sweeper')
     # 判断是否传入mboard文件
     filename = sys.argv[1] if len(sys.argv) > 1 else None
-    app = Application(root, filename)
+    session = None
+    if filename is None:  # 未传入mboard文件时询问是否继续上次的进度
+        session = load_session()
+        if session is not None and not askyesno(
+                'Resume', 'Resume the last session?', parent=root):
+            session = None
+    app = Application(root, filename, session)
     app.pack()
     setup_menu(root, app)
     bind_keys(root, app)
+    root.protocol('WM_DELETE_WINDOW', app.close)
     root.mainloop()
 
 
@@ -0,0 +1,164 @@
+'''
+Mine Sweeper -- minebatch.py
+Copyright(c) 2024 Liu One  All rights reserved.
+
+同时进行成千上万局游戏的批量环境，用于评估和训练自动扫雷的程序，详情参见BatchEnv。
+规则与mineboard.MineBoard的open_block()、mark_mine()、check_end()相同，
+但所有棋盘保存在NumPy数组中，每一步对所有棋盘同时打开格子、展开空白区域并判断胜负。
+需要安装NumPy。
+'''
+
+import numpy as np
+
+from minesolver import UNKNOWN, FLAG
+
+
+def neighbour_sum(cells):
+    '''返回每个格子周围8个格子的cells之和，cells的形状为(棋盘数, 高, 宽)。'''
+    cells = cells.astype(np.int8)
+    rows = cells.copy()  # 先按行、再按列求3x3窗口之和
+    rows[:, 1:] += cells[:, :-1]
+    rows[:, :-1] += cells[:, 1:]
+    total = rows.copy()
+    total[:, :, 1:] += rows[:, :, :-1]
+    total[:, :, :-1] += rows[:, :, 1:]
+    return total - cells
+
+
+def dilate(cells):
+    '''返回cells及其周围8个格子构成的区域，cells为布尔数组。'''
+    rows = cells.copy()  # 先按行、再按列扩展
+    rows[:, 1:] |= cells[:, :-1]
+    rows[:, :-1] |= cells[:, 1:]
+    result = rows.copy()
+    result[:, :, 1:] |= rows[:, :, :-1]
+    result[:, :, :-1] |= rows[:, :, 1:]
+    return result
+
+
+class BatchEnv:
+    '''
+    批量环境。
+    用例：
+    env = BatchEnv(4096, 30, 16, 99, seed=0)
+    observations = env.reset()
+    observations, rewards, dones, wins = env.step(actions)
+    每个棋盘每步执行一个动作，动作是0到2 * 高 * 宽 - 1的整数：
+    小于高 * 宽时打开第(动作 // 宽)行第(动作 % 宽)列的格子，否则标记或取消标记
+    第(动作 - 高 * 宽)个格子。观察与minedataset相同：0~8为已开格子周围雷的数量，
+    9为未开格子，10为已标记的雷或踩到的雷。
+    与Application一样，每局的棋盘在初次打开格子时才生成，点击点及其周围不会有雷。
+    '''
+
+    def __init__(
+            self, batch, width, height, mine_sum, seed=None, autoreset=True):
+        '''
+            batch :: 同时进行的游戏数。
+        autoreset :: 游戏结束后是否立即开始新游戏，此时step()返回新游戏的观察。
+        '''
+        if mine_sum > width * height - min(height, 3) * min(width, 3):
+            raise ValueError('too many mines for the board')
+        self.batch = batch
+        self.width = width
+        self.height = height
+        self.mine_sum = mine_sum
+        self.autoreset = autoreset
+        self.rng = np.random.default_rng(seed)
+        shape = (batch, height, width)
+        self.mines = np.zeros(shape, dtype=bool)     # 是否是雷
+        self.counts = np.zeros(shape, dtype=np.int8)  # 周围雷的数量
+        self.states = np.full(shape, -1, dtype=np.int8)  # 同MineBoard的格子状态
+        self.generated = np.zeros(batch, dtype=bool)  # 棋盘是否已生成
+        self.done = np.zeros(batch, dtype=bool)       # 游戏是否已结束
+
+    def reset(self, mask=None):
+        '''重新开始mask（默认为全部）中的游戏，返回观察。'''
+        if mask is None:
+            mask = np.ones(self.batch, dtype=bool)
+        self.mines[mask] = False
+        self.counts[mask] = 0
+        self.states[mask] = -1
+        self.generated[mask] = False
+        self.done[mask] = False
+        return self.observe()
+
+    def observe(self):
+        '''返回所有棋盘对玩家可见的状态。'''
+        opened = self.states == 0
+        observations = np.where(opened, self.counts, np.int8(UNKNOWN))
+        observations[(self.states == 1) | opened & self.mines] = FLAG
+        return observations
+
+    def generate(self, boards, rows, cols):
+        '''为boards中的棋盘生成雷，点击点(rows, cols)及其周围不能有雷。'''
+        near = (
+            (np.abs(np.arange(self.height)[None, :, None]
+                    - rows[:, None, None]) <= 1)
+            & (np.abs(np.arange(self.width)[None, None, :]
+                      - cols[:, None, None]) <= 1))
+        scores = self.rng.random((len(boards), self.height * self.width))
+        scores[near.reshape(len(boards), -1)] = 2  # 排除的格子排在最后
+        chosen = np.argpartition(scores, self.mine_sum - 1, axis=1)
+        mines = np.zeros_like(scores, dtype=bool)
+        if self.mine_sum:
+            np.put_along_axis(mines, chosen[:, :self.mine_sum], True, axis=1)
+        mines = mines.reshape(len(boards), self.height, self.width)
+        self.mines[boards] = mines
+        self.counts[boards] = neighbour_sum(mines)
+        self.generated[boards] = True
+
+    def step(self, actions):
+        '''
+        每个棋盘执行一个动作，已结束的游戏忽略动作。
+        return :: 元组(观察, 奖励, 本步是否结束, 本步是否胜利)，
+                  胜利的奖励为1，踩雷为-1，其它为0。
+        '''
+        actions = np.asarray(actions)
+        cells = actions % (self.height * self.width)
+        rows, cols = np.divmod(cells, self.width)
+        marking = actions >= self.height * self.width
+        boards = np.arange(self.batch)
+
+        opening = ~self.done & ~marking
+        first = opening & ~self.generated  # 初次点击，生成棋盘
+        if first.any():
+            self.generate(boards[first], rows[first], cols[first])
+
+        marking &= ~self.done & self.generated  # 初次点击前不能标记
+        b, r, c = boards[marking], rows[marking], cols[marking]
+        self.states[b, r, c] = np.where(
+            self.states[b, r, c] == 0, 0, -self.states[b, r, c])
+
+        opening &= self.states[boards, rows, cols] != 0
+        b, r, c = boards[opening], rows[opening], cols[opening]
+        self.states[b, r, c] = 0
+        lost = np.zeros(self.batch, dtype=bool)
+        lost[b] = self.mines[b, r, c]
+
+        # 展开空白区域：反复打开周围没有雷的已开格子的周围格子，
+        # 每轮只处理仍在展开的棋盘
+        blank = (self.counts[b, r, c] == 0) & ~self.mines[b, r, c]
+        active = b[blank]
+        frontier = np.zeros((len(active), self.height, self.width), dtype=bool)
+        frontier[np.arange(len(active)), r[blank], c[blank]] = True
+        while len(active):
+            states = self.states[active]
+            opened = dilate(frontier) & (states != 0)
+            states[opened] = 0
+            self.states[active] = states
+            frontier = opened & (self.counts[active] == 0)
+            going = frontier.any(axis=(1, 2))
+            active, frontier = active[going], frontier[going]
+
+        # 与check_end()相同：没有未开格子、标错的格子和打开的雷
+        wrong = (
+            (self.states == -1)
+            | (self.states == 1) & ~self.mines
+            | (self.states == 0) & self.mines)
+        won = ~self.done & self.generated & ~lost & ~wrong.any(axis=(1, 2))
+        ended = lost | won
+        self.done |= ended
+        rewards = won.astype(np.int8) - lost.astype(np.int8)
+        if self.autoreset and ended.any():
+            self.reset(ended)
+        return self.observe(), rewards, ended, won
@@ -0,0 +1,253 @@
+'''
+Mine Sweeper -- mineboard.py
+Copyright(c) 2024 Liu One  All rights reserved.
+
+扫雷的底层原理，不依赖图形界面，详情参见MineBoard。
+'''
+
+import array
+import random
+
+
+class MineBoard:
+    '''
+    扫雷的棋盘。
+    用例：
+    board = MineBoard(30, 16, 99)
+    board.generate(8, 15)            # 初次点击(8, 15)，生成棋盘
+    state, opened = board.reveal(8, 15)
+    board.mark_mine(0, 0)
+    Application继承此类，并用以GUI_开头的方法更新屏幕。
+    生成棋盘时用并查集标记所有空白区域（周围没有雷的格子连成的区域及其边界），
+    打开空白格子时一次打开整个区域，无需逐格展开。
+    '''
+    around_blocks = [  # 一个格子周围格子的相对位置
+        (1, 0), (-1, 0), (0, 1), (0, -1),
+        (1, 1), (-1, 1), (1, -1), (-1, -1)]
+    # Application同时继承tk.Frame，不会调用MineBoard.__init__()，因此设为类属性
+    regions = None      # 每个格子所在空白区域的编号，非空白格子为-1
+    region_cells = []   # 每个空白区域及其边界的格子的一维下标
+    region_grid = None  # 标记空白区域时的格子矩阵
+
+    def __init__(self, width, height, mine_sum):
+        '''初始化width x height、共有mine_sum个雷的棋盘，初次点击时才生成格子。'''
+        self.width = width
+        self.height = height
+        self.mine_sum = mine_sum
+        self.grid = None
+        self.first_click = True
+
+    def open_board(self, filename):
+        '''打开棋盘，返回元组(宽, 高, 雷数, 格子矩阵)。'''
+        file = open(filename)
+        line = file.readline()
+        width, height, mine_sum = [int(elem) for elem in line.split()]
+        grid = []
+        while line:
+            line = file.readline()[:-1].split()
+            if line:
+                grid.append([
+                    [int(num) for num in elem.split('.')]
+                    for elem in line])
+        return width, height, mine_sum, grid
+
+    def write_board(self, file):
+        '''将棋盘写入打开的文件，格式与open_board()相同。'''
+        file.write('{} {} {}\n'.format(self.width, self.height, self.mine_sum))
+        for line in self.grid:
+            for block_mine, block_state in line:
+                file.write('{}.{} '.format(block_mine, block_state))
+            file.write('\n')
+
+    def initial_grid(self, cells=None):
+        '''
+        初始化游戏格子。
+        width x height的格子矩阵，每个格子包括两个数。
+        第一个数是格子周围雷的数量，若格子是雷，则是-1。
+        第二个数是格子的状态，-1未打开，0已打开，1标记为雷，2标错。
+        cells :: 不能被设为雷的格子，用于初次点击。
+        '''
+        # 生成width x height的格子矩阵
+        grid = [[
+            [0, -1] for j in range(self.width)]
+            for i in range(self.height)]
+        mine_blocks = set(random.sample(  # 在矩阵中随机挑选格子
+            [(i, j) for j in range(self.width)
+                for i in range(self.height)
+                if cells is None or (i, j) not in cells],
+            self.mine_sum))
+        for i, j in mine_blocks:  # 将挑选的格子设置为雷
+            grid[i][j][0] = -1
+        for i in range(self.height):
+            for j in range(self.width):
+                if (i, j) not in mine_blocks:  # 计算未挑选的格子周围雷的数量
+                    grid[i][j][0] = sum([
+                        (i + di, j + dj) in mine_blocks
+                        for di, dj in self.around_blocks])
+        return grid
+
+    def pos_valid(self, i, j):
+        '''判断坐标(i, j)是否合法，返回布尔值。'''
+        return 0 <= i and i < self.height and 0 <= j and j < self.width
+
+    def get_around_blocks(self, i, j):
+        '''
+        返回格子(i, j)周围的情况。
+        return :: 元组(周围格子数, 周围雷数, 周围已打开格子数, 周围已标记为雷格子数)。
+        '''
+        block_count, opened_block, marked_block = 0, 0, 0
+        for di, dj in self.around_blocks:
+            if self.pos_valid(i + di, j + dj):
+                block_count += 1
+                if self.grid[i + di][j + dj][1] == 0:
+                    opened_block += 1
+                elif self.grid[i + di][j + dj][1] == 1:
+                    marked_block += 1
+        return block_count, self.grid[i][j][0], opened_block, marked_block
+
+    def open_block(self, i, j):
+        '''
+        打开格子。
+        return :: 1: 是雷，正常打开
+                  0: 不是雷，正常打开
+                 -1: 坐标非法，无法打开
+                 -2: 已打开，无法再次打开
+                 -3: 已踩雷，无法打开
+        '''
+        if not self.pos_valid(i, j):  # 坐标非法
+            return -1
+        elif self.grid[i][j][1] == 0:            # 已打开
+            return -2
+        elif self.grid[i][j][1] == 2:            # 已失败
+            return -3                          # 打开失败，退出
+        self.grid[i][j][1] = 0        # 设置为已打开
+        if self.grid[i][j][0] == -1:  # 是雷
+            return 1
+        return 0  # 不是雷
+
+    def mark_mine(self, i, j, mark=False):
+        '''
+        标记或取消标记格子为雷。
+        mark=False :: 若为True，则必须标记为雷，而非取消。
+        '''
+        if not self.pos_valid(i, j) or self.first_click:
+            return                                    # 坐标非法
+        if self.grid[i][j][1] not in (0, 2):
+            self.grid[i][j][1] = -self.grid[i][j][1]  # 标记或取消标记雷
+            if mark:
+                self.grid[i][j][1] = 1
+        return self.grid[i][j][1]                     # 返回当前状态
+
+    def check_end(self):
+        '''检查玩家是否正确打开和标记所有格子，即是否胜利。'''
+        for line in self.grid:
+            for block_mine, block_state in line:
+                if (block_state == 1
+                        and block_mine != -1  # 标记错的
+                    or block_state == -1      # 未打开的
+                    or block_state == 0       # 打开的雷（失败）
+                        and block_mine == -1):
+                    return False
+        return True
+
+    def generate(self, i, j):
+        '''初次点击(i, j)时生成棋盘，点击点及其周围不能有雷。'''
+        self.grid = self.initial_grid(cells=[
+            (i + di, j + dj)
+            for di, dj in [(0, 0)] + self.around_blocks])
+        self.first_click = False
+        self.label_regions()
+
+    def label_regions(self):
+        '''
+        用并查集标记self.grid中所有的空白区域。
+        八方向相连的空白格子属于同一区域，区域的边界是与其相邻的数字格子，
+        一个边界格子可能同时属于多个区域。
+        '''
+        width, height = self.width, self.height
+        blank = [
+            block_mine == 0 for line in self.grid for block_mine, _ in line]
+        parent = list(range(width * height))
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]  # 路径减半
+                index = parent[index]
+            return index
+
+        for i in range(height):
+            for j in range(width):
+                if not blank[i * width + j]:
+                    continue
+                for di, dj in ((0, 1), (1, -1), (1, 0), (1, 1)):
+                    if self.pos_valid(i + di, j + dj) \
+                            and blank[(i + di) * width + j + dj]:
+                        parent[find((i + di) * width + j + dj)] \
+                            = find(i * width + j)
+        self.regions = array.array('i', [-1]) * (width * height)
+        roots, members = {}, []
+        for i in range(height):
+            for j in range(width):
+                if not blank[i * width + j]:
+                    continue
+                root = find(i * width + j)
+                if root not in roots:
+                    roots[root] = len(members)
+                    members.append(set())
+                self.regions[i * width + j] = roots[root]
+                members[roots[root]].add(i * width + j)
+                for di, dj in self.around_blocks:  # 边界
+                    if self.pos_valid(i + di, j + dj):
+                        members[roots[root]].add((i + di) * width + j + dj)
+        self.region_cells = [
+            array.array('i', sorted(cells)) for cells in members]
+        self.region_grid = self.grid
+
+    def open_region(self, i, j):
+        '''
+        打开空白格子(i, j)所在的整个空白区域及其边界。
+        return :: 新打开的格子列表。
+        '''
+        if self.region_grid is not self.grid:  # 棋盘已替换（如撤销），重新标记
+            self.label_regions()
+        opened = []
+        for index in self.region_cells[self.regions[i * self.width + j]]:
+            if self.open_block(*divmod(index, self.width)) == 0:
+                opened.append(divmod(index, self.width))
+        return opened
+
+    def openings(self):
+        '''空白区域的数量。'''
+        if self.region_grid is not self.grid:
+            self.label_regions()
+        return len(self.region_cells)
+
+    def bbbv(self):
+        '''
+        棋盘的3BV，即不标记雷时打开所有非雷格子最少需要的点击数：
+        空白区域数加上不在任何空白区域边界上的数字格子数。
+        '''
+        if self.region_grid is not self.grid:
+            self.label_regions()
+        covered = set()
+        for cells in self.region_cells:
+            covered.update(cells)
+        return len(self.region_cells) + sum(
+            1 for index, (block_mine, _) in enumerate(
+                block for line in self.grid for block in line)
+            if block_mine > 0 and index not in covered)
+
+    def reveal(self, i, j):
+        '''
+        打开格子(i, j)，周围没有雷时打开其所在的整个空白区域。
+        return :: 元组(self.open_block(i, j)的返回值, 打开的格子列表)。
+        '''
+        if self.first_click:
+            self.generate(i, j)
+        state = self.open_block(i, j)
+        if state != 0:
+            return state, [(i, j)] if state == 1 else []
+        opened = [(i, j)]
+        if self.grid[i][j][0] == 0:
+            opened.extend(self.open_region(i, j))
+        return state, opened
@@ -0,0 +1,192 @@
+'''
+Mine Sweeper -- minedataset.py
+Copyright(c) 2024 Liu One  All rights reserved.
+
+无界面地自动玩扫雷，导出训练用的数据集，详情参见export()。
+每个局面保存为(可见状态, 标签)：可见状态是height x width的int8矩阵，
+0~8为已开格子周围雷的数量，9为未开格子，10为已标记的雷；
+标签是同样大小的int8矩阵，1为雷，0为非雷，-1为已打开的格子。
+局面按固定数量写入多个.npz分片，内存占用与总局面数无关。
+
+用法：python minedataset.py 目录 --shards 100 --shard-size 65536
+需要安装NumPy。
+'''
+
+import os
+import random
+import argparse
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from mineboard import MineBoard
+from minesolver import block_code, PatternSolver, ProbabilityEngine
+from minesolver import MonteCarloEstimator
+
+STRATEGIES = ('oracle', 'random', 'solver')
+
+
+def visible_state(board):
+    '''返回棋盘对玩家可见的状态。'''
+    return np.array([
+        [block_code(*block) for block in line]
+        for line in board.grid], dtype=np.int8)
+
+
+def mine_label(board):
+    '''返回棋盘的标签，已打开的格子为-1。'''
+    return np.array([
+        [-1 if block_state == 0 and block_mine != -1
+         else int(block_mine == -1)
+         for block_mine, block_state in line]
+        for line in board.grid], dtype=np.int8)
+
+
+def solver_tools(time_limit=.05):
+    '''
+    新建'solver'策略使用的推理程序和概率引擎，可在多局游戏之间复用。
+    time_limit :: 每次抽样的最长时间（秒），生成数据时不必追求精度。
+        return :: 元组(PatternSolver, ProbabilityEngine)。
+    '''
+    return PatternSolver(), ProbabilityEngine(  # 已在子进程中，抽样不能再使用子进程
+        estimator=MonteCarloEstimator(time_limit=time_limit, workers=1))
+
+
+def play_game(width, height, mine_sum, strategy, solver=None, engine=None):
+    '''
+    玩一局游戏，逐步产出(可见状态, 标签)。
+         strategy :: 'oracle'：随机打开一个非雷格子，不会失败；
+                     'random'：随机打开一个未开格子，踩到雷时结束；
+                     'solver'：打开推理出的非雷格子并标记雷，推不出时打开最可能非雷的格子。
+    solver, engine :: 'solver'策略使用的推理程序和概率引擎，
+                      默认由solver_tools()新建；多局游戏应传入同一组以复用缓存。
+    '''
+    board = MineBoard(width, height, mine_sum)
+    board.reveal(random.randrange(height), random.randrange(width))
+    if strategy == 'solver' and (solver is None or engine is None):
+        solver, engine = solver_tools()
+    while True:
+        unknown = [
+            (i, j) for i in range(height) for j in range(width)
+            if board.grid[i][j][1] == -1]
+        safe_blocks = [
+            (i, j) for i, j in unknown if board.grid[i][j][0] != -1]
+        if not safe_blocks:  # 所有非雷格子都已打开
+            return
+        yield visible_state(board), mine_label(board)
+        if strategy == 'oracle':
+            board.reveal(*random.choice(safe_blocks))
+            continue
+        if strategy == 'random':
+            state, _ = board.reveal(*random.choice(unknown))
+        else:
+            safe, mines = solver.deduce(board.grid)
+            for i, j in mines:
+                board.mark_mine(i, j, mark=True)
+            state = 0
+            for i, j in safe:
+                state, _ = board.reveal(i, j)
+            if not safe and not mines:
+                probabilities = engine.probabilities(board.grid, mine_sum)
+                guess = min(probabilities, key=probabilities.get) \
+                    if probabilities else random.choice(unknown)
+                state, _ = board.reveal(*guess)
+        if state == 1:  # 踩到雷
+            return
+
+
+def positions(width, height, density, strategy, solver=None, engine=None):
+    '''
+    不断地玩新游戏，产出无穷多个局面。
+    solver, engine :: 所有游戏共用的推理程序和概率引擎，参见play_game()。
+    '''
+    mine_sum = int(density * width * height)
+    if strategy == 'solver' and (solver is None or engine is None):
+        solver, engine = solver_tools()
+    while True:
+        yield from play_game(
+            width, height, mine_sum, strategy, solver, engine)
+
+
+def shard_path(directory, index):
+    '''第index个分片的路径。'''
+    return os.path.join(directory, 'shard-{:05d}.npz'.format(index))
+
+
+def export_shard(task):
+    '''
+    生成一个分片，在子进程中调用。
+    task :: 元组(目录, 分片序号, 局面数, 宽, 高, 雷密度, 策略, 随机种子)。
+    return :: 分片的路径。
+    '''
+    directory, index, size, width, height, density, strategy, seed = task
+    path = shard_path(directory, index)
+    if os.path.exists(path):  # 已生成的分片不再生成，便于中断后继续
+        return path
+    random.seed(seed)
+    states = np.empty((size, height, width), dtype=np.int8)
+    labels = np.empty((size, height, width), dtype=np.int8)
+    solver, engine = solver_tools() if strategy == 'solver' else (None, None)
+    stream = positions(width, height, density, strategy, solver, engine)
+    for k in range(size):
+        states[k], labels[k] = next(stream)
+    fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            np.savez(file, states=states, labels=labels)
+        os.replace(temp, path)  # 先写临时文件再重命名，不会留下不完整的分片
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return path
+
+
+def export(
+        directory, shards, shard_size=65536,
+        width=30, height=16, density=.2, strategy='oracle',
+        workers=None, seed=0):
+    '''
+    导出数据集，每完成一个分片就产出其路径。
+     directory :: 保存分片的目录。
+        shards :: 分片数，共shards * shard_size个局面。
+    shard_size :: 每个分片的局面数。
+    width, height, density :: 棋盘的宽、高和雷密度。
+      strategy :: 选择下一步的策略，参见play_game()。
+       workers :: 进程数，默认为CPU核数。
+          seed :: 随机种子，第k个分片使用seed + k。
+    '''
+    if strategy not in STRATEGIES:
+        raise ValueError('unknown strategy: {}'.format(strategy))
+    os.makedirs(directory, exist_ok=True)
+    tasks = [
+        (directory, index, shard_size, width, height,
+         density, strategy, seed + index)
+        for index in range(shards)]
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(export_shard, tasks)
+
+
+def main():
+    '''命令行入口。'''
+    parser = argparse.ArgumentParser(
+        description="Export Mine Sweeper positions as .npz shards.")
+    parser.add_argument('directory')
+    parser.add_argument('--shards', type=int, default=1)
+    parser.add_argument('--shard-size', type=int, default=65536)
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--height', type=int, default=16)
+    parser.add_argument('--density', type=float, default=.2)
+    parser.add_argument('--strategy', choices=STRATEGIES, default='oracle')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for path in export(
+            args.directory, args.shards, args.shard_size,
+            args.width, args.height, args.density, args.strategy,
+            args.workers, args.seed):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+'''
+Mine Sweeper -- minelibrary.py
+Copyright(c) 2024 Liu One  All rights reserved.
+
+mboard棋盘库，详情参见BoardLibrary。
+棋盘的大小、雷数、雷密度、3BV、能否不猜雷解开以及规范哈希保存在SQLite索引中。
+规范哈希对旋转和翻转不变，因此相同的棋盘在每种宽和高下只保存一次；
+旋转90度后宽和高互换，作为另一个棋盘保存，以便按宽和高查询。
+
+用法：python minelibrary.py index 目录
+      python minelibrary.py query --width 50 --height 50 --no-guess
+'''
+
+import os
+import pathlib
+import sqlite3
+import hashlib
+import argparse
+
+from mineboard import MineBoard
+from minesolver import PatternSolver
+
+LIBRARY_PATH = pathlib.Path.home() / '.minesweeper' / 'library.sqlite3'
+LIBRARY_VERSION = 1  # 索引格式的版本，旧版本的索引将被清空后重建
+
+
+def mine_layout(grid):
+    '''返回雷的分布，每行是一个由0和1组成的字符串。'''
+    return [
+        ''.join('1' if block_mine == -1 else '0' for block_mine, _ in line)
+        for line in grid]
+
+
+def canonical_hash(grid):
+    '''棋盘的规范哈希：取雷的分布在8种旋转和翻转下最小的编码，再计算SHA-1。'''
+    layout = mine_layout(grid)
+    variants = []
+    for _ in range(4):
+        layout = [''.join(line) for line in zip(*layout[::-1])]  # 旋转90度
+        variants.append(layout)
+        variants.append([line[::-1] for line in layout])         # 左右翻转
+    text = min(
+        '{}x{}:{}'.format(len(variant[0]) if variant else 0, len(variant),
+                          '/'.join(variant))
+        for variant in variants)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def start_block(board):
+    '''与Application.retry()相同，第一个周围没有雷的格子是推荐的首次点击点。'''
+    for i in range(board.height):
+        for j in range(board.width):
+            if board.grid[i][j][0] == 0:
+                return i, j
+    return None
+
+
+def no_guess(board):
+    '''判断棋盘能否从推荐的首次点击点开始，不猜雷地打开所有非雷格子。'''
+    start = start_block(board)
+    if start is None:
+        return False
+    board.reveal(*start)
+    solver = PatternSolver()
+    while True:
+        safe, mines = solver.deduce(board.grid)
+        if not safe and not mines:
+            break
+        for i, j in mines:
+            board.mark_mine(i, j, mark=True)
+        for i, j in safe:
+            board.reveal(i, j)
+    return all(
+        block_state == 0
+        for line in board.grid for block_mine, block_state in line
+        if block_mine != -1)
+
+
+def read_board(path):
+    '''读取mboard文件，返回所有格子都未打开的MineBoard。'''
+    board = MineBoard(0, 0, 0)
+    board.width, board.height, board.mine_sum, board.grid \
+        = board.open_board(path)
+    for line in board.grid:
+        for block in line:
+            block[1] = -1
+    board.first_click = False
+    return board
+
+
+class BoardLibrary:
+    '''
+    棋盘库。
+    用例：
+    library = BoardLibrary()
+    library.index('boards/')  # 索引目录中所有mboard文件
+    path = library.query(50, 50, density=.2, no_guess=True, bbbv=(150, 200))
+    '''
+    schema = '''
+        CREATE TABLE IF NOT EXISTS boards (
+            hash TEXT, path TEXT NOT NULL,
+            width INTEGER, height INTEGER, mine_sum INTEGER,
+            density REAL, bbbv INTEGER, solvable INTEGER,
+            PRIMARY KEY (hash, width, height));
+        CREATE INDEX IF NOT EXISTS boards_query
+            ON boards (width, height, solvable, bbbv);
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY, mtime REAL, hash TEXT);
+    '''
+
+    def __init__(self, path=LIBRARY_PATH):
+        '''path :: SQLite索引文件的路径。'''
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(path))
+        version, = self.connection.execute('PRAGMA user_version').fetchone()
+        if version < LIBRARY_VERSION:  # 旧索引的格式不同，清空后由index()重建
+            self.connection.executescript(
+                'DROP TABLE IF EXISTS boards; DROP TABLE IF EXISTS files;')
+        self.connection.executescript(self.schema)
+        self.connection.execute(
+            'PRAGMA user_version = {}'.format(LIBRARY_VERSION))
+
+    def close(self):
+        '''关闭索引。'''
+        self.connection.close()
+
+    def add(self, path):
+        '''
+        将一个mboard文件加入索引。文件未修改时跳过。
+        return :: 棋盘的规范哈希；与已有棋盘相同时不重复保存。
+        '''
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        row = self.connection.execute(
+            'SELECT mtime, hash FROM files WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[0] == mtime:
+            return row[1]
+        board = read_board(path)
+        key = canonical_hash(board.grid)
+        bbbv = board.bbbv()
+        solvable = no_guess(board)
+        with self.connection:
+            # 文件内容变化时，它原先保存的棋盘作废；
+            # 删除同一棋盘的文件记录，使其重复文件在下次索引时重新加入
+            self.connection.execute(
+                'DELETE FROM files WHERE hash IN'
+                ' (SELECT hash FROM boards WHERE path = ?)', (path,))
+            self.connection.execute(
+                'DELETE FROM boards WHERE path = ?', (path,))
+            self.connection.execute(
+                'INSERT OR IGNORE INTO boards VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, path, board.width, board.height, board.mine_sum,
+                 board.mine_sum / (board.width * board.height),
+                 bbbv, int(solvable)))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?)',
+                (path, mtime, key))
+        return key
+
+    def index(self, directory):
+        '''索引目录（包括子目录）中所有的mboard文件，返回索引的文件数。'''
+        count = 0
+        for path in sorted(pathlib.Path(directory).rglob('*.mboard')):
+            try:
+                self.add(path)
+                count += 1
+            except (OSError, ValueError, IndexError):
+                pass  # 跳过无法读取的文件
+        return count
+
+    def query(
+            self, width=None, height=None, density=None, tolerance=.01,
+            no_guess=None, bbbv=None):
+        '''
+        随机返回一个符合条件的棋盘文件的路径，没有时返回None。
+          density :: 雷密度，允许相差tolerance。
+         no_guess :: 为True时只返回不猜雷就能解开的棋盘。
+             bbbv :: 元组(最小值, 最大值)，3BV的范围。
+        '''
+        conditions, parameters = [], []
+        for column, value in (('width', width), ('height', height)):
+            if value is not None:
+                conditions.append('{} = ?'.format(column))
+                parameters.append(value)
+        if no_guess is not None:
+            conditions.append('solvable = ?')
+            parameters.append(int(no_guess))
+        if bbbv is not None:
+            conditions.append('bbbv BETWEEN ? AND ?')
+            parameters.extend(bbbv)
+        if density is not None:
+            conditions.append('density BETWEEN ? AND ?')
+            parameters.extend((density - tolerance, density + tolerance))
+        sql = 'SELECT hash, path FROM boards'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY RANDOM() LIMIT 1'
+        while True:
+            row = self.connection.execute(sql, parameters).fetchone()
+            if row is None:
+                return None
+            key, path = row
+            if os.path.exists(path):
+                return path
+            with self.connection:  # 文件已删除，从索引中移除
+                self.connection.execute(  # 旋转后的棋盘另有一行，不删除
+                    'DELETE FROM boards WHERE path = ?', (path,))
+                self.connection.execute(  # 重复的文件在下次索引时重新加入
+                    'DELETE FROM files WHERE hash = ?', (key,))
+
+
+def main():
+    '''命令行入口。'''
+    parser = argparse.ArgumentParser(
+        description="Index and query Mine Sweeper's mine boards.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    index_parser = commands.add_parser('index')
+    index_parser.add_argument('directory')
+    query_parser = commands.add_parser('query')
+    query_parser.add_argument('--width', type=int)
+    query_parser.add_argument('--height', type=int)
+    query_parser.add_argument('--density', type=float)
+    query_parser.add_argument('--tolerance', type=float, default=.01)
+    query_parser.add_argument('--no-guess', action='store_true', default=None)
+    query_parser.add_argument('--bbbv', type=int, nargs=2)
+    args = parser.parse_args()
+    library = BoardLibrary()
+    if args.command == 'index':
+        print(library.index(args.directory))
+    else:
+        print(library.query(
+            args.width, args.height, args.density, args.tolerance,
+            args.no_guess, args.bbbv))
+    library.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,814 @@
+'''
+Mine Sweeper -- minesolver.py
+Copyright(c) 2024 Liu One  All rights reserved.
+
+扫雷的推理程序，只使用玩家可见的信息，详情参见PatternSolver。
+真实棋盘上的推理大多由很小的局部图案决定，因此先以已开格子为中心，
+对其周围5x5窗口计算Zobrist哈希，在图案缓存中查找窗口中必然的结果，
+找不到时才在窗口内推理并存入缓存；缓存可以保存到磁盘，供以后的游戏共用。
+'''
+
+import os
+import json
+import math
+import time
+import random
+import pathlib
+import collections
+import concurrent.futures
+
+from autosave import write_atomic
+
+PATTERN_PATH = pathlib.Path.home() / '.minesweeper' / 'patterns.json'
+
+UNKNOWN, FLAG, OUTSIDE = 9, 10, 11  # 格子编码，0~8为已开格子周围雷的数量
+CODE_COUNT = 12
+MIN_BATCHES = 5  # 抽样至少得到这么多批才给出置信区间或提前结束
+around_blocks = [  # 一个格子周围格子的相对位置
+    (1, 0), (-1, 0), (0, 1), (0, -1),
+    (1, 1), (-1, 1), (1, -1), (-1, -1)]
+
+
+def block_code(block_mine, block_state):
+    '''返回格子对玩家可见的编码。'''
+    if block_state == 1 or block_state == 0 and block_mine == -1:
+        return FLAG     # 标记为雷或已踩到的雷
+    if block_state == 0:
+        return block_mine
+    return UNKNOWN      # 未打开或标错（失败后）
+
+
+def count_solutions(constraints):
+    '''
+    穷举满足所有约束的雷的分布并计数。
+    constraints :: 形如[(格子元组, 雷数), ...]的约束列表。
+         return :: 元组(counts, cell_counts)。counts[k]是共有k个雷的分布数，
+                   cell_counts[格子][k]是其中该格子是雷的分布数。
+    '''
+    cells = []
+    for group, _ in constraints:
+        for cell in group:
+            if cell not in cells:
+                cells.append(cell)
+    index = {cell: k for k, cell in enumerate(cells)}
+    watch = [[] for cell in cells]  # 每个格子所在的约束
+    groups = []
+    for k, (group, mines) in enumerate(constraints):
+        groups.append(([index[cell] for cell in group], mines))
+        for cell in group:
+            watch[index[cell]].append(k)
+    assigned = [None] * len(cells)
+    counts = [0] * (len(cells) + 1)
+    mine_counts = [[0] * (len(cells) + 1) for cell in cells]
+
+    def feasible(k):
+        group, mines = groups[k]
+        placed = sum(assigned[c] == 1 for c in group)
+        free = sum(assigned[c] is None for c in group)
+        return placed <= mines <= placed + free
+
+    def search(depth, placed):
+        if depth == len(cells):
+            counts[placed] += 1
+            for k, value in enumerate(assigned):
+                mine_counts[k][placed] += value
+            return
+        for value in (0, 1):
+            assigned[depth] = value
+            if all(feasible(k) for k in watch[depth]):
+                search(depth + 1, placed + value)
+        assigned[depth] = None
+
+    search(0, 0)
+    return counts, dict(zip(cells, mine_counts))
+
+
+def forced_cells(constraints):
+    '''
+    返回满足所有约束的雷的分布中必然的结果。
+    constraints :: 形如[(格子元组, 雷数), ...]的约束列表。
+         return :: 字典{格子: 是否是雷}，只包含在所有分布中结果都相同的格子；
+                   约束矛盾时返回空字典。
+    '''
+    counts, cell_counts = count_solutions(constraints)
+    total = sum(counts)
+    if total == 0:
+        return {}
+    forced = {}
+    for cell, mine_counts in cell_counts.items():
+        mine_total = sum(mine_counts)
+        if mine_total in (0, total):
+            forced[cell] = mine_total == total
+    return forced
+
+
+def deduce_subsets(constraints):
+    '''
+    通用的推理：对有公共格子的两个约束A、B，若!B-!A等于B-A的大小，
+    则B-A都是雷，A-B都不是雷（包括帮助文档中的3号法则和1--2定理）。
+    constraints :: 形如[(格子元组, 雷数), ...]的约束列表。
+         return :: 元组(非雷格子集合, 雷格子集合)。
+    '''
+    safe, mines = set(), set()
+    groups = [(frozenset(group), count) for group, count in constraints]
+    by_cell = collections.defaultdict(list)
+    for group, count in groups:
+        if count == 0:
+            safe |= group
+        elif count == len(group):
+            mines |= group
+        for cell in group:
+            by_cell[cell].append((group, count))
+    for group_a, count_a in groups:
+        others = {
+            other for cell in group_a for other in by_cell[cell]}
+        for group_b, count_b in others:
+            only_b = group_b - group_a
+            if count_b - count_a == len(only_b):
+                mines |= only_b
+                safe |= group_a - group_b
+    return safe - mines, mines
+
+
+def grid_constraints(grid):
+    '''返回格子矩阵中所有已开格子的约束，形如[(格子元组, 剩余雷数), ...]。'''
+    height, width = len(grid), len(grid[0]) if grid else 0
+    constraints = []
+    for i in range(height):
+        for j in range(width):
+            code = block_code(*grid[i][j])
+            if code > 8:
+                continue
+            unknown, flags = [], 0
+            for di, dj in around_blocks:
+                if 0 <= i + di < height and 0 <= j + dj < width:
+                    around = block_code(*grid[i + di][j + dj])
+                    if around == UNKNOWN:
+                        unknown.append((i + di, j + dj))
+                    elif around == FLAG:
+                        flags += 1
+            if unknown:
+                constraints.append((tuple(unknown), code - flags))
+    return constraints
+
+
+class PatternCache:
+    '''
+    局部图案的LRU缓存，键为窗口的Zobrist哈希，值为窗口内必然的结果。
+    为避免哈希冲突，同时保存窗口的编码以便核对。
+    '''
+
+    def __init__(self, radius=2, maxsize=65536):
+        '''radius :: 窗口半径，2即5x5窗口。maxsize :: 最多缓存的图案数。'''
+        self.radius = radius
+        self.maxsize = maxsize
+        self.patterns = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key, codes):
+        '''查找图案，找不到时返回None。'''
+        entry = self.patterns.get(key)
+        if entry is None or entry[0] != codes:
+            self.misses += 1
+            return None
+        self.patterns.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, codes, moves):
+        '''存入图案。moves :: 形如((di, dj, 是否是雷), ...)的相对于窗口中心的结果。'''
+        self.patterns[key] = (codes, moves)
+        self.patterns.move_to_end(key)
+        if len(self.patterns) > self.maxsize:
+            self.patterns.popitem(last=False)  # 移除最久未用的图案
+
+    def save(self, path=PATTERN_PATH):
+        '''保存为图案库文件，与autosave一样先写临时文件再重命名。'''
+        write_atomic(path, json.dumps({
+            'radius': self.radius,
+            'patterns': [
+                [format(key, 'x'), codes.hex(), moves]
+                for key, (codes, moves) in self.patterns.items()],
+        }, separators=(',', ':')))
+
+    @classmethod
+    def load(cls, path=PATTERN_PATH, radius=2, maxsize=65536):
+        '''读取图案库文件，没有、损坏或窗口大小不同时返回空的缓存。'''
+        cache = cls(radius, maxsize)
+        try:
+            data = json.loads(pathlib.Path(path).read_text())
+            if data['radius'] != radius:
+                return cache
+            for key, codes, moves in data['patterns']:
+                cache.put(
+                    int(key, 16), bytes.fromhex(codes),
+                    tuple(tuple(move) for move in moves))
+        except (OSError, ValueError, KeyError, TypeError):
+            cache.patterns.clear()
+        return cache
+
+
+class PatternSolver:
+    '''
+    带图案缓存的推理程序。
+    用例：
+    solver = PatternSolver(PatternCache.load())
+    safe, mines = solver.deduce(grid)
+    solver.cache.save()
+    每个格子都保存以其为中心的窗口的Zobrist哈希，格子编码变化时，
+    只需更新包含它的窗口的哈希。
+    '''
+    zobrist_seed = 20240101  # 固定种子，使哈希在不同运行之间一致
+
+    def __init__(self, cache=None):
+        '''cache :: 图案缓存，默认新建一个。'''
+        self.cache = cache if cache is not None else PatternCache()
+        radius = self.cache.radius
+        self.offsets = [
+            (di, dj) for di in range(-radius, radius + 1)
+            for dj in range(-radius, radius + 1)]
+        rng = random.Random(self.zobrist_seed)
+        self.zobrist = [
+            [rng.getrandbits(64) for code in range(CODE_COUNT)]
+            for offset in self.offsets]
+        self.width = self.height = 0
+        self.codes = []   # 每个格子的编码
+        self.hashes = []  # 以每个格子为中心的窗口的哈希
+
+    def reset(self, width, height):
+        '''棋盘大小变化时重新计算所有哈希，此时所有格子都未打开。'''
+        self.width, self.height = width, height
+        self.codes = [UNKNOWN] * (width * height)
+        self.hashes = [
+            self.window_hash(i, j)
+            for i in range(height) for j in range(width)]
+
+    def code(self, i, j):
+        '''格子(i, j)的编码，棋盘外为OUTSIDE。'''
+        if 0 <= i < self.height and 0 <= j < self.width:
+            return self.codes[i * self.width + j]
+        return OUTSIDE
+
+    def window_hash(self, i, j):
+        '''完整计算以(i, j)为中心的窗口的哈希。'''
+        key = 0
+        for k, (di, dj) in enumerate(self.offsets):
+            key ^= self.zobrist[k][self.code(i + di, j + dj)]
+        return key
+
+    def window_codes(self, i, j):
+        '''以(i, j)为中心的窗口的编码。'''
+        return bytes(self.code(i + di, j + dj) for di, dj in self.offsets)
+
+    def set_code(self, i, j, code):
+        '''更新格子(i, j)的编码，并增量更新包含它的窗口的哈希。'''
+        old = self.codes[i * self.width + j]
+        if old == code:
+            return
+        self.codes[i * self.width + j] = code
+        for k, (di, dj) in enumerate(self.offsets):
+            ci, cj = i - di, j - dj  # (i, j)相对于中心(ci, cj)的位置为(di, dj)
+            if 0 <= ci < self.height and 0 <= cj < self.width:
+                self.hashes[ci * self.width + cj] ^= \
+                    self.zobrist[k][old] ^ self.zobrist[k][code]
+
+    def sync(self, grid, cells=None):
+        '''
+        使编码与格子矩阵一致。
+        cells=None :: 可能变化的格子，给出则只检查这些格子，否则检查所有格子。
+        '''
+        height, width = len(grid), len(grid[0]) if grid else 0
+        if (width, height) != (self.width, self.height):
+            self.reset(width, height)
+            cells = None
+        if cells is None:
+            cells = ((i, j) for i in range(height) for j in range(width))
+        for i, j in cells:
+            self.set_code(i, j, block_code(*grid[i][j]))
+
+    def solve_window(self, i, j):
+        '''在以(i, j)为中心的窗口内推理，返回相对于中心的结果。'''
+        radius = self.cache.radius
+        constraints = []
+        for ci in range(i - radius + 1, i + radius):
+            for cj in range(j - radius + 1, j + radius):
+                code = self.code(ci, cj)
+                if code > 8:
+                    continue
+                unknown, flags = [], 0
+                for di, dj in around_blocks:
+                    around = self.code(ci + di, cj + dj)
+                    if around == UNKNOWN:
+                        unknown.append((ci + di - i, cj + dj - j))
+                    elif around == FLAG:
+                        flags += 1
+                if unknown:
+                    constraints.append((tuple(unknown), code - flags))
+        return tuple(sorted(
+            (di, dj, int(is_mine))
+            for (di, dj), is_mine in forced_cells(constraints).items()))
+
+    def deduce(self, grid, cells=None):
+        '''
+        推理格子矩阵中必然的结果。
+        cells=None :: 参见self.sync()。
+            return :: 元组(非雷格子集合, 雷格子集合)。
+        先以每个周围有未开格子的已开格子为中心查找图案缓存，
+        图案推不出结果时再运行通用的推理deduce_subsets()。
+        '''
+        self.sync(grid, cells)
+        safe, mines = set(), set()
+        for i in range(self.height):
+            for j in range(self.width):
+                if self.codes[i * self.width + j] > 8 or all(
+                        self.code(i + di, j + dj) != UNKNOWN
+                        for di, dj in around_blocks):
+                    continue
+                key = self.hashes[i * self.width + j]
+                codes = self.window_codes(i, j)
+                moves = self.cache.get(key, codes)
+                if moves is None:
+                    moves = self.solve_window(i, j)
+                    self.cache.put(key, codes, moves)
+                for di, dj, is_mine in moves:
+                    (mines if is_mine else safe).add((i + di, j + dj))
+        if not safe and not mines:
+            safe, mines = deduce_subsets(grid_constraints(grid))
+        return safe - mines, mines - safe
+
+
+def comb(n, k):
+    '''组合数，k超出范围时为0。'''
+    if k < 0 or k > n:
+        return 0
+    return math.comb(n, k)
+
+
+def convolve(first, second):
+    '''多项式乘法，用于合并不同板块的分布数。'''
+    result = [0] * (len(first) + len(second) - 1)
+    for a, x in enumerate(first):
+        if x:
+            for b, y in enumerate(second):
+                result[a + b] += x * y
+    return result
+
+
+def t_quantile(df):
+    '''自由度为df的t分布的97.5%分位数，用于少量样本的95%置信区间。'''
+    table = (
+        12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+    if df <= len(table):
+        return table[df - 1]
+    z = 1.959964  # 自由度更大时用正态分位数的展开式
+    return z + (z ** 3 + z) / (4 * df) \
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+
+
+def log_comb(n, k):
+    '''组合数的自然对数，k超出范围时为-inf。'''
+    if k < 0 or k > n:
+        return -math.inf
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+
+def sample_batch(constraints, density, samples, seed):
+    '''
+    随机抽取满足一个板块的约束的雷的分布，用于MonteCarloEstimator。
+    逐格选择值，每次选择后沿约束传播必然的结果（某约束剩余的格子必须都是雷
+    或都不是雷），两个值都不矛盾时以density为雷的概率随机选择，
+    每个样本的重要性权重为其抽样概率的倒数，加权计数即分布数的无偏估计。
+    return :: 元组(最大对数权重, counts, cell_counts)，与count_solutions()相同，
+              counts[k]为共有k个雷的样本的权重和，cell_counts[c][k]为其中第c个格子
+              是雷的样本的权重和，权重均已除以exp(最大对数权重)；
+              格子顺序与约束中首次出现的顺序一致。
+    '''
+    rng = random.Random(seed)
+    cells, index = [], {}
+    for group, _ in constraints:
+        for cell in group:
+            if cell not in index:
+                index[cell] = len(cells)
+                cells.append(cell)
+    members = [[index[cell] for cell in group] for group, _ in constraints]
+    watch = [[] for cell in cells]  # 每个格子所在的约束
+    for k, group in enumerate(members):
+        for c in group:
+            watch[c].append(k)
+    needs = [mines for _, mines in constraints]
+    density = min(max(density, .01), .99)
+    log_chance = (math.log(1 - density), math.log(density))
+    assigned = [None] * len(cells)
+    placed, free = [0] * len(members), [len(group) for group in members]
+    trail = []  # 已赋值格子的顺序，用于撤销
+
+    def assign(c, value):
+        '''给格子c赋值并传播，出现矛盾时返回False（需调用undo()撤销）。'''
+        pending = [(c, value)]
+        while pending:
+            c, value = pending.pop()
+            if assigned[c] is not None:
+                if assigned[c] != value:
+                    return False
+                continue
+            assigned[c] = value
+            trail.append(c)
+            for k in watch[c]:
+                placed[k] += value
+                free[k] -= 1
+            for k in watch[c]:
+                if not placed[k] <= needs[k] <= placed[k] + free[k]:
+                    return False
+                if free[k] and needs[k] in (placed[k], placed[k] + free[k]):
+                    fill = int(needs[k] != placed[k])
+                    pending.extend(
+                        (other, fill) for other in members[k]
+                        if assigned[other] is None)
+        return True
+
+    def undo(mark):
+        '''撤销到trail的长度为mark时的状态。'''
+        while len(trail) > mark:
+            c = trail.pop()
+            for k in watch[c]:
+                placed[k] -= assigned[c]
+                free[k] += 1
+            assigned[c] = None
+
+    results = []
+    for _ in range(samples):
+        log_weight = 0.0
+        for c in range(len(cells)):
+            if assigned[c] is not None:
+                continue
+            mark = len(trail)
+            options = []
+            for value in (0, 1):
+                if assign(c, value):
+                    options.append(value)
+                undo(mark)
+            if not options:  # 走入死路，权重为0
+                log_weight = -math.inf
+                break
+            if len(options) == 1:
+                value = options[0]
+            else:
+                value = int(rng.random() < density)
+                log_weight -= log_chance[value]
+            assign(c, value)
+        if log_weight != -math.inf:
+            results.append((log_weight, list(assigned)))
+        undo(0)
+    counts = [0.0] * (len(cells) + 1)
+    cell_counts = [[0.0] * (len(cells) + 1) for cell in cells]
+    if not results:
+        return -math.inf, counts, cell_counts
+    top = max(log_weight for log_weight, _ in results)
+    for log_weight, values in results:
+        weight = math.exp(log_weight - top)
+        mines = sum(values)
+        counts[mines] += weight
+        for c, value in enumerate(values):
+            if value:
+                cell_counts[c][mines] += weight
+    return top, counts, cell_counts
+
+
+class MonteCarloEstimator:
+    '''
+    板块过大、无法穷举时，用抽样估计板块的分布数及每个格子是雷的概率的置信区间。
+    用例：
+    estimator = MonteCarloEstimator(time_limit=1, tolerance=0.02)
+    cells, batches = estimator.estimate(constraints, density)
+    probabilities, errors = estimator.combine(batches, weights)
+    estimator.close()
+    抽样分成许多批，在多个进程中并行进行；每批的估计相互独立，
+    概率是各批总和之比，由各批的差异和t分布给出95%置信区间的半宽，
+    不足MIN_BATCHES批时不给出置信区间。
+    '''
+
+    def __init__(
+            self, time_limit=1.0, tolerance=0.01,
+            workers=None, batch_size=200, seed=None):
+        '''
+        time_limit :: 最长的抽样时间（秒）。
+         tolerance :: 所有格子的置信区间半宽都小于此值时提前结束。
+           workers :: 进程数，默认为CPU核数，为1时不使用子进程。
+        batch_size :: 每批的抽样数。
+        '''
+        self.time_limit = time_limit
+        self.tolerance = tolerance
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.executor = None
+
+    def close(self):
+        '''结束子进程。'''
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def run_batches(self, args):
+        '''在时间限制内反复抽样，每得到一批结果就产出一次，调用者可随时停止。'''
+        deadline = time.perf_counter() + self.time_limit
+        if self.workers == 1:
+            while True:
+                yield sample_batch(*args, self.batch_size, self.rng.random())
+                if time.perf_counter() > deadline:
+                    return
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                self.workers)
+        running = {
+            self.executor.submit(
+                sample_batch, *args, self.batch_size, self.rng.random())
+            for _ in range(self.workers * 2)}
+        try:
+            while running:
+                done, running = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                    if time.perf_counter() <= deadline:
+                        running.add(self.executor.submit(
+                            sample_batch, *args, self.batch_size,
+                            self.rng.random()))
+        finally:
+            for future in running:
+                future.cancel()
+
+    def estimate(self, constraints, density):
+        '''
+        估计一个板块的分布数。
+        constraints :: 一个板块的约束列表，形如[(格子元组, 剩余雷数), ...]。
+            density :: 抽样时选择雷的概率，一般为未开格子中雷的平均密度。
+             return :: 元组(格子列表, 各批sample_batch()的结果)，
+                       不含没有抽到有效分布的批；约束矛盾时批的列表为空。
+        '''
+        cells = []
+        for group, _ in constraints:
+            for cell in group:
+                if cell not in cells:
+                    cells.append(cell)
+        weights = [1] * (len(cells) + 1)  # 判断精度时不考虑板块外的格子
+        batches = []
+        for batch in self.run_batches((list(constraints), density)):
+            if batch[0] != -math.inf:
+                batches.append(batch)
+            if len(batches) >= MIN_BATCHES:  # 批数足够时才判断精度
+                _, errors = self.combine(batches, weights)
+                if max(errors, default=0) < self.tolerance:
+                    break
+        return cells, batches
+
+    @staticmethod
+    def combine(batches, weights):
+        '''
+        按板块中雷数的权重合并各批的结果。
+        weights :: weights[k]为板块共有k个雷时板块外的分布数，可以是很大的整数。
+         return :: 元组(各格子为雷的概率, 95%置信区间的半宽)，均为列表；
+                   不足MIN_BATCHES批时半宽为1；
+                   所有样本的权重都为0时概率为空列表。
+        '''
+        largest = max(weights, default=0) or 1
+        weights = [weight / largest for weight in weights]
+        top = max(batch[0] for batch in batches)
+        totals = []       # 每批的加权总和
+        cell_totals = []  # 每批中每个格子是雷的加权和
+        for batch_top, counts, cell_counts in batches:
+            scale = math.exp(batch_top - top)
+            totals.append(
+                sum(x * w for x, w in zip(counts, weights)) * scale)
+            cell_totals.append([
+                sum(x * w for x, w in zip(mine_counts, weights)) * scale
+                for mine_counts in cell_counts])
+        total = sum(totals)
+        if total == 0:
+            return [], []
+        n = len(batches)
+        probabilities = [
+            sum(values) / total for values in zip(*cell_totals)]
+
+        def error(index):
+            # 比值估计的标准误差：各批残差x - p * y的方差除以平均的总和
+            if n < MIN_BATCHES:
+                return 1.0
+            p = probabilities[index]
+            variance = sum(
+                (values[index] - p * y) ** 2
+                for values, y in zip(cell_totals, totals)) / (n - 1)
+            return t_quantile(n - 1) * math.sqrt(variance / n) / (total / n)
+
+        return probabilities, [
+            error(index) for index in range(len(probabilities))]
+
+    @staticmethod
+    def scaled_counts(batches):
+        '''
+        将各批的分布数估计合并并放大为整数，以便与穷举的分布数做多项式乘法。
+        各板块的分布数同乘一个常数不影响概率。
+        return :: 元组(counts, cell_counts)，cell_counts[c]为第c个格子的计数。
+        '''
+        top = max(batch[0] for batch in batches)
+        counts = [0.0] * len(batches[0][1])
+        cell_counts = [[0.0] * len(counts) for _ in batches[0][2]]
+        for batch_top, batch_counts, batch_cells in batches:
+            scale = math.exp(batch_top - top)
+            for k, value in enumerate(batch_counts):
+                counts[k] += value * scale
+            for c, mine_counts in enumerate(batch_cells):
+                for k, value in enumerate(mine_counts):
+                    cell_counts[c][k] += value * scale
+        factor = 2 ** 52 / (max(counts) or 1)
+        return (
+            [round(value * factor) for value in counts],
+            [[round(value * factor) for value in mine_counts]
+             for mine_counts in cell_counts])
+
+
+class ProbabilityEngine:
+    '''
+    计算每个未开格子是雷的概率。
+    用例：
+    engine = ProbabilityEngine()
+    probabilities = engine.probabilities(grid, mine_sum)  # {格子: 概率}
+    已开格子的约束按公共格子连成互不相关的板块，每个板块的分布数在两次调用之间缓存。
+    每一步只有格子变化的板块需要重新穷举，其它板块的分布数直接复用，
+    只需按剩余雷数重新归一化。
+    格子数超过exact_limit的板块改用MonteCarloEstimator估计其分布数，
+    再与其它板块穷举的分布数合并；估计的结果同样缓存，板块不变时不再抽样。
+    '''
+
+    def __init__(self, exact_limit=60, estimator=None):
+        '''
+        exact_limit :: 可以穷举的板块的最大格子数。
+          estimator :: 板块过大时使用的MonteCarloEstimator，默认新建一个。
+        '''
+        self.exact_limit = exact_limit
+        self.estimator = estimator or MonteCarloEstimator()
+        self.width = self.height = 0
+        self.codes = []         # 每个格子的编码
+        self.constraints = {}   # 已开格子 -> (周围未开格子元组, 剩余雷数)
+        self.components = {}    # 板块的约束元组 -> (counts, cell_counts, 抽样结果)
+        self.errors = {}        # 上次计算的置信区间半宽，穷举时均为0
+
+    def reset(self, width, height):
+        '''棋盘大小变化时清空所有缓存。'''
+        self.width, self.height = width, height
+        self.codes = [UNKNOWN] * (width * height)
+        self.constraints = {}
+        self.components = {}
+
+    def code(self, i, j):
+        '''格子(i, j)的编码，棋盘外为OUTSIDE。'''
+        if 0 <= i < self.height and 0 <= j < self.width:
+            return self.codes[i * self.width + j]
+        return OUTSIDE
+
+    def update(self, grid, cells=None):
+        '''
+        比较格子的编码，只重新计算变化的格子附近的约束。
+        cells=None :: 上次以来可能变化的格子；为None时比较整个格子矩阵。
+        '''
+        height, width = len(grid), len(grid[0]) if grid else 0
+        if (width, height) != (self.width, self.height):
+            self.reset(width, height)
+            cells = None  # 编码已清空，必须比较所有格子
+        if cells is None:
+            cells = ((i, j) for i in range(height) for j in range(width))
+        touched = set()
+        for i, j in cells:
+            code = block_code(*grid[i][j])
+            if code != self.codes[i * width + j]:
+                self.codes[i * width + j] = code
+                touched.add((i, j))
+                touched.update((i + di, j + dj) for di, dj in around_blocks)
+        for i, j in touched:
+            self.constraints.pop((i, j), None)
+            code = self.code(i, j)
+            if code > 8:
+                continue
+            unknown, flags = [], 0
+            for di, dj in around_blocks:
+                around = self.code(i + di, j + dj)
+                if around == UNKNOWN:
+                    unknown.append((i + di, j + dj))
+                elif around == FLAG:
+                    flags += 1
+            if unknown:
+                self.constraints[i, j] = (tuple(unknown), code - flags)
+
+    def split_components(self):
+        '''将约束按公共格子分为板块，返回各板块排序后的约束元组。'''
+        parent = {}
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        for group, _ in self.constraints.values():
+            for cell in group:
+                parent.setdefault(cell, cell)
+            for cell in group[1:]:
+                parent[find(cell)] = find(group[0])
+        components = collections.defaultdict(list)
+        for constraint in self.constraints.values():
+            components[find(constraint[0][0])].append(constraint)
+        return [tuple(sorted(component)) for component in components.values()]
+
+    def component_counts(self, components, density):
+        '''
+        返回各板块的分布数，只计算缓存中没有的板块，并丢弃已失效的缓存。
+        density :: 未开格子中雷的平均密度，抽样时使用。
+         return :: 列表[(counts, cell_counts, 抽样结果), ...]，抽样结果为元组
+                   (格子列表, 各批的结果)，穷举的板块为None。
+        '''
+        cached = {}
+        for component in components:
+            result = self.components.get(component)
+            if result is not None:
+                pass
+            elif len({cell for group, _ in component for cell in group}) \
+                    > self.exact_limit:  # 板块过大，抽样估计
+                cells, batches = self.estimator.estimate(component, density)
+                if batches:
+                    counts, cell_counts = self.estimator.scaled_counts(batches)
+                else:  # 没有抽到有效分布，视为约束矛盾
+                    counts = [0] * (len(cells) + 1)
+                    cell_counts = [counts] * len(cells)
+                result = (
+                    counts, dict(zip(cells, cell_counts)), (cells, batches))
+            else:
+                result = count_solutions(component) + (None,)
+            cached[component] = result
+        self.components = cached
+        return [cached[component] for component in components]
+
+    def probabilities(self, grid, mine_sum, cells=None):
+        '''
+        计算每个未开格子是雷的概率。
+          mine_sum :: 棋盘的总雷数，用于对各板块的分布数归一化。
+        cells=None :: 上次计算以来可能变化的格子，参见self.update()。
+            return :: 字典{格子: 概率}；约束矛盾（如标错）时返回空字典。
+        '''
+        self.update(grid, cells)
+        components = self.split_components()
+        frontier = {
+            cell for group, _ in self.constraints.values() for cell in group}
+        floating = [  # 不在任何约束中的未开格子
+            (i, j) for i in range(self.height) for j in range(self.width)
+            if self.codes[i * self.width + j] == UNKNOWN
+            and (i, j) not in frontier]
+        remaining = mine_sum - self.codes.count(FLAG)
+        results = self.component_counts(
+            components, remaining / max(self.codes.count(UNKNOWN), 1))
+
+        # prefix[c]为前c个板块分布数之积，suffix[c]为第c个及以后板块分布数之积
+        prefix, suffix = [[1]], [[1]]
+        for counts, _, _ in results:
+            prefix.append(convolve(prefix[-1], counts))
+        for counts, _, _ in reversed(results):
+            suffix.append(convolve(suffix[-1], counts))
+        suffix.reverse()
+        # 板块中共有s个雷时，其余的雷在不受约束的格子中的分布数，只与s有关
+        binomials = [
+            comb(len(floating), remaining - s)
+            for s in range(len(prefix[-1]))]
+        total = sum(
+            count * binomial
+            for count, binomial in zip(prefix[-1], binomials))
+        if total == 0:
+            return {}
+
+        probabilities = {}
+        self.errors = {}
+        for c, (counts, cell_counts, sampled) in enumerate(results):
+            others = convolve(prefix[c], suffix[c + 1])  # 其它板块的分布数
+            weights = [
+                sum(count * binomial
+                    for count, binomial in zip(others, binomials[k:]))
+                for k in range(len(counts))]
+            if sampled is not None:  # 由各批的差异给出置信区间
+                cells, batches = sampled
+                values, errors = self.estimator.combine(batches, weights)
+                probabilities.update(zip(cells, values))
+                self.errors.update(zip(cells, errors))
+                continue
+            for cell, mine_counts in cell_counts.items():
+                probabilities[cell] = sum(
+                    x * w for x, w in zip(mine_counts, weights)) / total
+                self.errors[cell] = 0.0
+        if floating:
+            floating_probability = sum(
+                count * comb(len(floating) - 1, remaining - t - 1)
+                for t, count in enumerate(prefix[-1])) / total
+            floating_error = max(self.errors.values(), default=0.0)
+            for cell in floating:
+                probabilities[cell] = floating_probability
+                self.errors[cell] = floating_error  # 抽样时取最宽的置信区间
+        return probabilities
@@ -0,0 +1,451 @@
+'''
+Mine Sweeper -- minesparse.py
+Copyright(c) 2024 Liu One  All rights reserved.
+
+雷密度很低的超大棋盘，详情参见SparseBoard和SparseGrid。
+格子矩阵不为每个格子保存数据：雷按行保存为有序的列号数组，周围雷的数量在需要时计算
+并缓存，已打开的格子按行保存为游程编码的区间，标记按行保存在字典中。
+每个雷占4字节，每段已打开的区间占8字节，100000 x 100000、雷密度1%的棋盘的雷约占400MB。
+低密度时首次点击的空白区域几乎覆盖整个棋盘，因此空白区域只在SparseBoard.window内填充，
+其余部分留待视野移到附近时再由SparseBoard.fill()继续填充。已打开的区间约每个雷一段，
+只在填充过的范围内占用内存。不设window时一次填充完，耗时和内存都与棋盘面积成正比：
+10000 x 10000、雷密度1%时首次点击约需17秒。
+'''
+
+import math
+import random
+import bisect
+import collections
+from array import array
+
+from mineboard import MineBoard
+
+
+def merge_spans(spans):
+    '''合并相交或相邻的区间，返回有序的区间列表。'''
+    merged = []
+    for a, b in sorted(spans):
+        if merged and a <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+    return [(a, b) for a, b in merged]
+
+
+def clip_spans(spans, lo, hi):
+    '''将区间列表分为[lo, hi)以内和以外的部分，返回元组(以内的区间, 以外的区间)。'''
+    inside, outside = [], []
+    for a, b in spans:
+        if max(a, lo) < min(b, hi):
+            inside.append((max(a, lo), min(b, hi)))
+        outside.extend(
+            piece for piece in ((a, min(b, lo)), (max(a, hi), b))
+            if piece[0] < piece[1])
+    return inside, outside
+
+
+class SparseBlock:
+    '''稀疏格子矩阵中的一个格子，与MineBoard.grid中的[雷, 状态]用法相同。'''
+    __slots__ = ('grid', 'i', 'j')
+
+    def __init__(self, grid, i, j):
+        self.grid = grid
+        self.i = i
+        self.j = j
+
+    def __getitem__(self, index):
+        if index in (0, -2):
+            return self.grid.mine_count(self.i, self.j)
+        elif index in (1, -1):
+            return self.grid.state(self.i, self.j)
+        raise IndexError('block index out of range')
+
+    def __setitem__(self, index, value):
+        if index not in (1, -1):
+            raise TypeError('only the state of a sparse block can be set')
+        self.grid.set_state(self.i, self.j, value)
+
+    def __iter__(self):
+        yield self[0]
+        yield self[1]
+
+    def __len__(self):
+        return 2
+
+
+class SparseRow:
+    '''稀疏格子矩阵中的一行。'''
+    __slots__ = ('grid', 'i')
+
+    def __init__(self, grid, i):
+        self.grid = grid
+        self.i = i
+
+    def __getitem__(self, j):
+        return SparseBlock(self.grid, self.i, j)
+
+    def __iter__(self):
+        for j in range(self.grid.width):
+            yield SparseBlock(self.grid, self.i, j)
+
+    def __len__(self):
+        return self.grid.width
+
+
+class SparseGrid:
+    '''
+    稀疏的格子矩阵，grid[i][j][0]为格子周围雷的数量（雷为-1），grid[i][j][1]为格子的
+    状态（-1未打开，0已打开，1标记为雷，2标错），与MineBoard.grid相同，
+    因此MineBoard的open_block()、mark_mine()、get_around_blocks()无需修改。
+    用例：
+    grid = SparseGrid(100000, 100000, 10 ** 8, cells=[(0, 0)])
+    grid[5][7][1] = 0
+    spans = grid.open_span(6, 0, 100)
+    '''
+
+    def __init__(self, width, height, mine_sum, cells=(), maxsize=65536):
+        '''
+           cells :: 不能被设为雷的格子，用于初次点击。
+         maxsize :: 最多缓存的周围雷的数量。
+        '''
+        self.width = width
+        self.height = height
+        self.mine_sum = mine_sum
+        self.maxsize = maxsize
+        self.mines = [array('i') for i in range(height)]  # 每行雷的列号，有序
+        self.opened = {}       # 行 -> 已打开区间的端点[起点, 终点, ...]，左闭右开
+        self.marks = {}        # 行 -> {列: 状态}，状态为1或2
+        self.exploded = set()  # 打开的雷
+        self.opened_sum = 0    # 已打开的格子数
+        self.pending = {}      # 行 -> 属于已打开的空白区域、尚未填充的区间
+        self.counts = collections.OrderedDict()  # 周围雷的数量的LRU缓存
+        self.scatter({
+            (i, j) for i, j in cells if 0 <= i < height and 0 <= j < width})
+
+    def scatter(self, cells):
+        '''
+        随机放置self.mine_sum个雷，cells中的格子除外。
+        先让每个格子以相同的概率成为雷，用几何分布的间隔跳过非雷格子，耗时与雷数成正比；
+        再随机去掉多出的雷或补上缺少的雷，结果与从所有格子中均匀抽取相同。
+        '''
+        total = self.width * self.height
+        if self.mine_sum > total - len(cells):
+            raise ValueError('too many mines for the board')
+        count = 0
+        if 0 < self.mine_sum < total - len(cells):
+            log_rate = math.log1p(-self.mine_sum / (total - len(cells)))
+            index = -1
+            while True:
+                index += 1 + int(math.log(1 - random.random()) / log_rate)
+                if index >= total:
+                    break
+                i, j = divmod(index, self.width)
+                if (i, j) not in cells:
+                    self.mines[i].append(j)
+                    count += 1
+        elif self.mine_sum:  # 除cells外全是雷
+            for i in range(self.height):
+                self.mines[i].extend(
+                    j for j in range(self.width) if (i, j) not in cells)
+            count = self.mine_sum
+        if count > self.mine_sum:  # 随机去掉多出的雷
+            starts = [0]
+            for line in self.mines:
+                starts.append(starts[-1] + len(line))
+            removed = collections.defaultdict(set)
+            for index in random.sample(range(count), count - self.mine_sum):
+                i = bisect.bisect_right(starts, index) - 1
+                removed[i].add(index - starts[i])
+            for i, indexes in removed.items():
+                self.mines[i] = array('i', (
+                    j for k, j in enumerate(self.mines[i])
+                    if k not in indexes))
+        while count < self.mine_sum:  # 随机补上缺少的雷
+            i, j = divmod(random.randrange(total), self.width)
+            if (i, j) not in cells and not self.is_mine(i, j):
+                bisect.insort(self.mines[i], j)
+                count += 1
+
+    def close_all(self):
+        '''关闭所有格子并清除标记，用于重新尝试同一棋盘。'''
+        self.opened.clear()
+        self.marks.clear()
+        self.pending.clear()
+        self.exploded.clear()
+        self.opened_sum = 0
+
+    def is_mine(self, i, j):
+        '''格子(i, j)是否是雷。'''
+        line = self.mines[i]
+        k = bisect.bisect_left(line, j)
+        return k < len(line) and line[k] == j
+
+    def mine_count(self, i, j):
+        '''格子(i, j)周围雷的数量，格子是雷时返回-1。'''
+        key = i * self.width + j
+        count = self.counts.get(key)
+        if count is not None:
+            self.counts.move_to_end(key)
+            return count
+        if self.is_mine(i, j):
+            count = -1
+        else:
+            count = 0
+            for row in range(max(i - 1, 0), min(i + 2, self.height)):
+                line = self.mines[row]
+                count += bisect.bisect_right(line, j + 1) \
+                    - bisect.bisect_left(line, j - 1)
+        self.counts[key] = count
+        if len(self.counts) > self.maxsize:
+            self.counts.popitem(last=False)  # 移除最久未用的格子
+        return count
+
+    def is_opened(self, i, j):
+        '''格子(i, j)是否已打开。'''
+        return bisect.bisect_right(self.opened.get(i, ()), j) % 2 == 1
+
+    def state(self, i, j):
+        '''格子(i, j)的状态。'''
+        if self.is_opened(i, j):
+            return 0
+        return self.marks.get(i, {}).get(j, -1)
+
+    def set_state(self, i, j, state):
+        '''设置格子(i, j)的状态。'''
+        if self.is_opened(i, j):
+            if state == 0:
+                return
+            self.remove_span(i, j, j + 1)
+            self.exploded.discard((i, j))
+        marks = self.marks.setdefault(i, {})
+        marks.pop(j, None)
+        if state == 0:
+            self.add_span(i, j, j + 1)
+            if self.is_mine(i, j):
+                self.exploded.add((i, j))
+        elif state != -1:
+            marks[j] = state
+        if not marks:
+            del self.marks[i]
+
+    def add_span(self, i, start, stop):
+        '''将第i行未打开的区间[start, stop)加入已打开的区间，与相邻的区间合并。'''
+        spans = self.opened.setdefault(i, array('i'))
+        lo = bisect.bisect_left(spans, start)
+        hi = bisect.bisect_right(spans, stop)
+        spans[lo:hi] = array(
+            'i', ([start] if lo % 2 == 0 else [])
+            + ([stop] if hi % 2 == 0 else []))
+        self.opened_sum += stop - start
+
+    def remove_span(self, i, start, stop):
+        '''从已打开的区间中去掉第i行已打开的区间[start, stop)。'''
+        spans = self.opened[i]
+        lo = bisect.bisect_left(spans, start)
+        hi = bisect.bisect_right(spans, stop)
+        spans[lo:hi] = array(
+            'i', ([start] if lo % 2 == 1 else [])
+            + ([stop] if hi % 2 == 1 else []))
+        if not spans:
+            del self.opened[i]
+        self.opened_sum -= stop - start
+
+    def closed_gaps(self, i, intervals):
+        '''第i行中有序且不相交的区间intervals里未打开的部分，返回区间列表。'''
+        spans = self.opened.get(i, ())
+        gaps = []
+        for start, stop in intervals:
+            k = bisect.bisect_right(spans, start)
+            pos = start
+            if k % 2 == 1:  # start已打开，跳到所在区间的终点
+                pos, k = spans[k], k + 1
+            while pos < stop:
+                end = min(spans[k], stop) if k < len(spans) else stop
+                if pos < end:
+                    gaps.append((pos, end))
+                if k + 1 >= len(spans):
+                    break
+                pos, k = spans[k + 1], k + 2
+        return gaps
+
+    def open_spans(self, i, intervals):
+        '''
+        打开第i行有序且不相交的区间intervals中未打开的格子，与open_block()相同，
+        标错的格子不打开。区间中不能有雷。整行的区间只重建一次。
+        return :: 新打开的区间列表[(起点, 终点), ...]。
+        '''
+        gaps = self.closed_gaps(i, intervals)
+        marks = self.marks.get(i)
+        if marks and gaps:  # 去掉标错的格子，标记为雷的格子将被打开
+            for j in sorted(marks):
+                k = bisect.bisect_right(gaps, (j, self.width)) - 1
+                if k < 0 or gaps[k][1] <= j:
+                    continue
+                if marks[j] == 1:
+                    del marks[j]
+                else:
+                    a, b = gaps[k]
+                    gaps[k:k + 1] = [
+                        piece for piece in ((a, j), (j + 1, b))
+                        if piece[0] < piece[1]]
+            if not marks:
+                del self.marks[i]
+        if gaps:
+            spans = self.opened.get(i, ())
+            self.opened[i] = array('i', [
+                end for span in merge_spans(
+                    list(zip(spans[::2], spans[1::2])) + gaps)
+                for end in span])
+            self.opened_sum += sum(b - a for a, b in gaps)
+        return gaps
+
+    def open_span(self, i, start, stop):
+        '''打开第i行[start, stop)中未打开的格子，参见open_spans()。'''
+        return self.open_spans(i, [(start, stop)])
+
+    def blank_runs(self, i, lo=0, hi=None):
+        '''
+        第i行中与[lo, hi)相交的空白区间，即周围没有雷的连续格子，区间不截断。
+        只查找相邻3行中[lo, hi)附近的雷。
+        return :: [(起点, 终点), ...]。
+        '''
+        if hi is None:
+            hi = self.width
+        cols = []
+        for row in range(max(i - 1, 0), min(i + 2, self.height)):
+            line = self.mines[row]
+            a = bisect.bisect_left(line, lo - 1)
+            b = bisect.bisect_left(line, hi + 1)
+            cols.extend(line[max(a - 1, 0):b + 1])  # 两侧最近的雷决定区间的端点
+        cols.sort()
+        runs, pos = [], 0
+        for j in cols:
+            if j - 1 > pos:
+                runs.append((pos, j - 1))
+            pos = max(pos, j + 2)
+        if pos < self.width:
+            runs.append((pos, self.width))
+        return [(a, b) for a, b in runs if a < hi and b > lo]
+
+    def __getitem__(self, i):
+        return SparseRow(self, i)
+
+    def __iter__(self):
+        for i in range(self.height):
+            yield SparseRow(self, i)
+
+    def __len__(self):
+        return self.height
+
+
+class SparseBoard(MineBoard):
+    '''
+    使用SparseGrid的棋盘，用于雷密度很低的超大棋盘。
+    用例：
+    board = SparseBoard(100000, 100000, 10 ** 8)
+    state, box = board.reveal(50000, 50000)
+    board.mark_mine(0, 0)
+    与MineBoard不同，空白区域在打开时按行区间扫描填充，不预先标记；
+    reveal()返回新打开的格子的范围，而非格子列表。
+    设置window后空白区域只在其中填充，window改变后调用fill()继续填充。
+    '''
+    window = None  # 填充空白区域的范围(上, 左, 下, 右)，均包含在内；None为整个棋盘
+
+    def generate(self, i, j):
+        '''初次点击(i, j)时生成棋盘，点击点及其周围不能有雷。'''
+        self.grid = SparseGrid(
+            self.width, self.height, self.mine_sum, cells=[
+                (i + di, j + dj)
+                for di, dj in [(0, 0)] + self.around_blocks])
+        self.first_click = False
+
+    def open_region(self, i, j):
+        '''
+        打开空白格子(i, j)所在的整个空白区域及其边界，只填充self.window内的部分。
+        return :: 新打开的格子的范围(上, 左, 下, 右)，均包含在内；没有时返回None。
+        '''
+        self.grid.remove_span(i, j, j + 1)  # 先关闭(i, j)，由填充重新打开
+        self.grid.pending.setdefault(i, []).append((j, j + 1))
+        return self.fill()
+
+    def fill(self):
+        '''
+        继续填充已打开的空白区域在self.window内尚未填充的部分。
+        按行扫描填充：每次处理一行中所有待填充的区间，再把填充的空白区间及其两侧
+        交给相邻的两行，耗时与填充的空白区间的数量成正比，而非格子数。
+        window以外的区间留在grid.pending中。
+        return :: 新打开的格子的范围(上, 左, 下, 右)，均包含在内；没有时返回None。
+        '''
+        grid = self.grid
+        pending = grid.pending
+        top, left, bottom, right = self.window or (
+            0, 0, self.height - 1, self.width - 1)
+        queue = collections.deque(sorted(
+            row for row in pending if top <= row <= bottom))
+        queued = set(queue)
+        box = None
+        while queue:
+            row = queue.popleft()
+            queued.discard(row)
+            inside, outside = clip_spans(
+                merge_spans(pending.pop(row)), left, right + 1)
+            gaps = grid.closed_gaps(row, inside)
+            filled = []
+            if gaps:
+                # 与未打开的区间相交的空白区间尚未填充，连同两侧一起打开
+                k = 0
+                for a, b in grid.blank_runs(row, gaps[0][0], gaps[-1][1]):
+                    while k < len(gaps) and gaps[k][1] <= a:
+                        k += 1
+                    if k < len(gaps) and gaps[k][0] < b:
+                        filled.append(
+                            (max(a - 1, 0), min(b + 1, self.width)))
+                filled = merge_spans(filled)  # 相邻两行也要打开window以外的两侧
+                within, beyond = clip_spans(filled, left, right + 1)
+                outside += beyond
+                opened = grid.open_spans(row, merge_spans(gaps + within))
+                if opened:
+                    a, b = opened[0][0], opened[-1][1] - 1
+                    box = [row, a, row, b] if box is None else [
+                        min(box[0], row), min(box[1], a),
+                        max(box[2], row), max(box[3], b)]
+            if outside:  # window以外的部分留待以后填充
+                pending[row] = outside
+            for near in (row - 1, row + 1):
+                if filled and 0 <= near < self.height:
+                    pending.setdefault(near, []).extend(filled)
+                    if top <= near <= bottom and near not in queued:
+                        queue.append(near)
+                        queued.add(near)
+        return tuple(box) if box is not None else None
+
+    def check_end(self):
+        '''检查玩家是否正确打开和标记所有格子，即是否胜利。'''
+        grid = self.grid
+        marked = 0
+        for i, marks in grid.marks.items():
+            for j, block_state in marks.items():
+                if block_state == 1 and not grid.is_mine(i, j):  # 标记错的
+                    return False
+                marked += 1
+        return not grid.exploded \
+            and grid.opened_sum + marked == self.width * self.height
+
+    def reveal(self, i, j):
+        '''
+        打开格子(i, j)，周围没有雷时打开其所在的整个空白区域。
+        return :: 元组(self.open_block(i, j)的返回值, 新打开的格子的范围或None)。
+        '''
+        if self.first_click:
+            self.generate(i, j)
+        state = self.open_block(i, j)
+        if state not in (0, 1):
+            return state, None
+        box = (i, j, i, j)
+        if state == 0 and self.grid[i][j][0] == 0:
+            region = self.open_region(i, j)
+            if region is not None:
+                box = (
+                    min(box[0], region[0]), min(box[1], region[1]),
+                    max(box[2], region[2]), max(box[3], region[3]))
+        return state, box
@@ -9,8 +9,7 @@ Double click to open a block.
 单击标记格子为雷，双击打开格子。
 '''
 
-import random
-import functools
+import time
 import pathlib
 
 import tkinter as tk
@@ -20,13 +19,20 @@ from tkinter.filedialog import asksaveasfile
 from tkinter.constants import *
 
 from utility import sequence_copy, ask_settings
+from mineboard import MineBoard
 from minehelper import MineHelper, HandleHelper
+from autosave import AutoSaver
+from minesolver import PatternSolver, PatternCache, ProbabilityEngine
+from minesolver import MonteCarloEstimator
+from telemetry import Telemetry
+from minelibrary import BoardLibrary
 
 
-class Application(tk.Frame):
+class Application(tk.Frame, MineBoard):
     '''
     扫雷主体。参数详见Application.__init__()。
-    所有以GUI_开头的方法都是图形用户界面的直接操作，其它一般是底层原理实现。
+    所有以GUI_开头的方法都是图形用户界面的直接操作，其它一般是底层原理实现，
+    底层原理继承自mineboard.MineBoard。
     '''
 
     colors = [  # 格子周围雷的数量决定格子的前景色
@@ -34,33 +40,69 @@ class Application(tk.Frame):
         'Red', 'DarkBlue', 'DarkRed',
         'Purple', 'Gray', 'DarkGray']
     filetypes = [("Mine Sweeper's Mine Board", '*.mboard')]
-    around_blocks = [  # 一个格子周围格子的相对位置
-        (1, 0), (-1, 0), (0, 1), (0, -1),
-        (1, 1), (-1, 1), (1, -1), (-1, -1)]
-
-    def __init__(self, master, filename=None):
+    autosave_interval = 5000  # 自动保存的间隔，单位为毫秒
+    minimap_size = 150        # 小地图的最大边长，单位为像素
+    minimap_colors = {        # 小地图中格子的颜色
+        'unknown': '#8c8c8c', 'opened': '#f0e68c', 'flag': '#ff4500',
+        'mine': '#000000', 'wrong': '#800080'}
+    block_tag = 'MineBlock'   # 所有按钮共用的绑定标签
+
+    def __init__(self, master, filename=None, session=None):
         '''
         初始化游戏。
         filename=None :: mboard文件名，给出则打开文件，没有给出则忽略，并自主询问信息。
+         session=None :: 自动保存的进度，参见autosave.load_session()，给出则继续该进度。
         '''
         super().__init__(master)
 
         self.GUI_load_image()                           # 加载图片
         self.recent_grids = [sequence_copy(self.grid)]  # 历史记录，用于撤销操作
         self.first_click = True                         # 是否初次点击
+        self.block_grid = []                            # 按钮矩阵，新游戏时复用
+        self.block_cells = {}                           # 按钮路径到格子的映射
+        self.click_command = None                       # 单击按钮时的Tcl命令
         self.have_won = False                           # 是否胜利
+        self.have_lost = False                          # 是否失败
         self.auto = tk.IntVar(self, 0)                  # 是否自动排雷
-        if filename is None:  # 未传入mboard文件
-            self.block_grid = []
+        self.autosaver = AutoSaver()                    # 后台自动保存
+        self.modified = 0                               # 进度改变的次数
+        self.saved = 0                                  # 上次保存时的self.modified
+        self.solver = PatternSolver(PatternCache.load())  # 自动排雷的推理程序
+        self.hint = tk.IntVar(self, 0)                  # 是否提示最安全的格子
+        self.engine = ProbabilityEngine(                # 计算提示用的概率，
+            estimator=MonteCarloEstimator(time_limit=.2))  # 抽样不能久占界面
+        self.hint_block = None                          # 当前提示的格子
+        self.changed_blocks = None                      # 变化的格子，None时全部比较
+        self.overlay_blocks = []                        # 显示了概率的格子
+        self.minimap_image = None                       # 小地图，每个格子一个像素
+        self.minimap_label = None
+        self.minimap_dirty = set()                      # 小地图中需要重画的行
+        self.minimap_job = None                         # 重画小地图的回调
+        self.record = tk.IntVar(self, 0)                # 是否记录游戏事件
+        self.telemetry = Telemetry()                    # 游戏事件的记录
+        if session is not None:  # 继续上次的进度
+            self.width, self.height, self.mine_sum, self.grid, history \
+                = session
+            self.recent_grids = history or [sequence_copy(self.grid)]
+            self.first_click = False
+            self.block_grid = self.GUI_grid_buttons()
+            self.GUI_setup_minimap()
+            self.GUI_update_cells()
+        elif filename is None:  # 未传入mboard文件
             self.new_game()   # 自主询问信息
         else:                 # 传入mboard文件
             self.width, self.height, self.mine_sum, self.grid \
                 = self.open_board(filename)            # 打开文件
+            self.first_click = False                   # 棋盘已生成
             self.block_grid = self.GUI_grid_buttons()  # 按钮矩阵
+            self.GUI_setup_minimap()
             self.GUI_update_cells()
+        self.after(self.autosave_interval, self.autosave)
 
     def retry(self):
         '''重新尝试同一棋盘。'''
+        self.have_won = self.have_lost = False
+        self.modified += 1
         flag = True
         for i in range(self.height):
             for j in range(self.width):
@@ -71,25 +113,51 @@ class Application(tk.Frame):
                     self.block_grid[i][j].configure(
                         image=self.click_image)
                     flag = False
+        self.GUI_mark_dirty(*range(self.height))
+        self.changed_blocks = None
 
     def new_game(self, event=None):
         '''自主询问游戏配置信息，然后开始新游戏。'''
-        self.width, self.height, difficulty_rate, filename \
+        self.width, self.height, difficulty_rate, filename, library \
             = ask_settings(self.master)  # 自主询问信息
+        if filename is None and library[0]:  # 从棋盘库中挑选
+            filename = self.find_board(difficulty_rate, library[0] == 2)
+            if filename is None:
+                showwarning(
+                    'No Board',
+                    'There is no such board in the library.'
+                    ' A random board will be used.', parent=self.master)
         if filename is not None:
             self.width, self.height, self.mine_sum, self.grid \
                 = self.open_board(filename)        # 打开文件
         else:
             self.mine_sum = int(difficulty_rate * self.width * self.height)
-        # 重置按钮矩阵
-        if self.block_grid:
-            for line in self.block_grid:
-                for button in line:
-                    button.destroy()               # 销毁旧按钮
-        self.block_grid = self.GUI_grid_buttons()  # 创建新按钮
+        self.first_click = filename is None  # 打开文件时棋盘已生成
+        self.have_won = self.have_lost = False
+        self.emit(
+            'start', width=self.width, height=self.height,
+            mine_sum=self.mine_sum,
+            density=self.mine_sum / (self.width * self.height),
+            board_file=filename is not None)
+        self.block_grid = self.GUI_grid_buttons()  # 重置按钮矩阵
+        self.GUI_setup_minimap()
+        self.changed_blocks = None
         if filename is not None:
             self.GUI_update_cells()  # 更新格子
-        self.first_click = True
+
+    def find_board(self, difficulty_rate, no_guess):
+        '''
+        在棋盘库中挑选大小为当前设置、雷密度接近difficulty_rate的棋盘。
+        no_guess :: 是否只挑选不猜雷就能解开的棋盘。
+          return :: 棋盘文件名，没有时返回None。
+        '''
+        library = BoardLibrary()
+        try:
+            return library.query(
+                self.width, self.height, difficulty_rate,
+                no_guess=no_guess or None)
+        finally:
+            library.close()
 
     def save_board(self, event=None):
         '''保存棋盘。'''
@@ -98,14 +166,46 @@ class Application(tk.Frame):
             initialfile='untitled',
             parent=self.master)
         if file is not None:
-            file.write('{} {} {}\n'.format(
-                self.width, self.height, self.mine_sum))
-            for line in self.grid:
-                for block_mine, block_state in line:
-                    file.write('{}.{} '.format(block_mine, block_state))
-                file.write('\n')
+            self.write_board(file)
             file.close()
 
+    def submit_autosave(self):
+        '''
+        将当前进度交给后台线程保存，编码和写入都不在主循环中进行。
+        游戏结束后删除存档，下次启动时不再继续已结束的游戏。进度未改变时什么也不做。
+        '''
+        if self.saved == self.modified:
+            return
+        self.saved = self.modified
+        if self.have_won or self.have_lost:
+            self.autosaver.clear()
+        elif not self.first_click:  # 初次点击前棋盘尚未生成
+            self.autosaver.submit((
+                self.width, self.height, self.mine_sum,
+                sequence_copy(self.grid), list(self.recent_grids)))
+
+    def autosave(self):
+        '''定时自动保存进度。'''
+        self.submit_autosave()
+        self.after(self.autosave_interval, self.autosave)
+
+    def close(self, event=None):
+        '''保存进度后关闭窗口。'''
+        self.submit_autosave()
+        self.autosaver.stop()
+        self.telemetry.stop()
+        self.engine.estimator.close()
+        try:
+            self.solver.cache.save()  # 保存图案库，供以后的游戏使用
+        except OSError:
+            pass
+        self.master.destroy()
+
+    def emit(self, event, **fields):
+        '''在用户选择记录时记录游戏事件，参见telemetry.Telemetry。'''
+        if self.record.get():
+            self.telemetry.emit(event, **fields)
+
     def show_help(self, event=None):
         '''显示位于minehelper.py中的帮助文档。'''
         MineHelper(self.master)
@@ -115,111 +215,6 @@ class Application(tk.Frame):
         HandleHelper(
             self.master, title='Handle Helper', width=280, height=120)
 
-    def open_board(self, filename):
-        '''打开棋盘，返回元组(宽, 高, 雷数, 格子矩阵)。'''
-        file = open(filename)
-        line = file.readline()
-        width, height, mine_sum = [int(elem) for elem in line.split()]
-        grid = []
-        while line:
-            line = file.readline()[:-1].split()
-            if line:
-                grid.append([
-                    [int(num) for num in elem.split('.')]
-                    for elem in line])
-        return width, height, mine_sum, grid
-
-    def initial_grid(self, cells=None):
-        '''
-        初始化游戏格子。
-        width x height的格子矩阵，每个格子包括两个数。
-        第一个数是格子周围雷的数量，若格子是雷，则是-1。
-        第二个数是格子的状态，-1未打开，0已打开，1标记为雷，2标错。
-        cells :: 不能被设为雷的格子，用于初次点击。
-        '''
-        # 生成width x height的格子矩阵
-        grid = [[
-            [0, -1] for j in range(self.width)]
-            for i in range(self.height)]
-        mine_blocks = random.sample(  # 在矩阵中随机挑选格子
-            [(i, j) for j in range(self.width)
-                for i in range(self.height)
-                if cells is not None and (i, j) not in cells],
-            self.mine_sum)
-        for i, j in mine_blocks:  # 将挑选的格子设置为雷
-            grid[i][j][0] = -1
-        for i in range(self.height):
-            for j in range(self.width):
-                if (i, j) not in mine_blocks:  # 计算未挑选的格子周围雷的数量
-                    grid[i][j][0] = sum([
-                        (i + di, j + dj) in mine_blocks
-                        for di, dj in self.around_blocks])
-        return grid
-
-    def pos_valid(self, i, j):
-        '''判断坐标(i, j)是否合法，返回布尔值。'''
-        return 0 <= i and i < self.height and 0 <= j and j < self.width
-
-    def get_around_blocks(self, i, j):
-        '''
-        返回格子(i, j)周围的情况。
-        return :: 元组(周围格子数, 周围雷数, 周围已打开格子数, 周围已标记为雷格子数)。
-        '''
-        block_count, opened_block, marked_block = 0, 0, 0
-        for di, dj in self.around_blocks:
-            if self.pos_valid(i + di, j + dj):
-                block_count += 1
-                if self.grid[i + di][j + dj][1] == 0:
-                    opened_block += 1
-                elif self.grid[i + di][j + dj][1] == 1:
-                    marked_block += 1
-        return block_count, self.grid[i][j][0], opened_block, marked_block
-
-    def open_block(self, i, j):
-        '''
-        打开格子。
-        return :: 1: 是雷，正常打开
-                  0: 不是雷，正常打开
-                 -1: 坐标非法，无法打开
-                 -2: 已打开，无法再次打开
-                 -3: 已踩雷，无法打开
-        '''
-        if not self.pos_valid(i, j):  # 坐标非法
-            return -1
-        elif self.grid[i][j][1] == 0:            # 已打开
-            return -2
-        elif self.grid[i][j][1] == 2:            # 已失败
-            return -3                          # 打开失败，退出
-        self.grid[i][j][1] = 0        # 设置为已打开
-        if self.grid[i][j][0] == -1:  # 是雷
-            return 1
-        return 0  # 不是雷
-
-    def mark_mine(self, i, j, mark=False):
-        '''
-        标记或取消标记格子为雷。
-        mark=False :: 参见self.GUI_mark_mine()。
-        '''
-        if not self.pos_valid(i, j) or self.first_click:
-            return                                    # 坐标非法
-        if self.grid[i][j][1] not in (0, 2):
-            self.grid[i][j][1] = -self.grid[i][j][1]  # 标记或取消标记雷
-            if mark:
-                self.grid[i][j][1] = 1
-        return self.grid[i][j][1]                     # 返回当前状态
-
-    def check_end(self):
-        '''检查玩家是否正确打开和标记所有格子，即是否胜利。'''
-        for line in self.grid:
-            for block_mine, block_state in line:
-                if (block_state == 1
-                        and block_mine != -1  # 标记错的
-                    or block_state == -1      # 未打开的
-                    or block_state == 0       # 打开的雷（失败）
-                        and block_mine == -1):
-                    return False
-        return True
-
     def GUI_load_image(self):
         '''加载所需图标。'''
         folder = 'images/'
@@ -231,24 +226,65 @@ class Application(tk.Frame):
         self.click_image = tk.PhotoImage(file=folder + 'click.gif')  # 点击位置
 
     def GUI_grid_buttons(self):
-        '''布局按钮，返回按钮矩阵。'''
-        block_grid = [
-            [None for j in range(self.width)]
-            for i in range(self.height)]  # 按钮矩阵
-        for i in range(self.height):
-            for j in range(self.width):  # 设置按钮并添加到按钮矩阵
-                button = tk.Button(
-                    self, image=self.empty_image, compound=CENTER,
-                    width=30, height=30,
-                    command=functools.partial(
-                        self.GUI_mark_mine, i, j))  # 单击标记为雷
-                button.bind(                        # 双击打开
-                    '<Double-Button-1>',
-                    functools.partial(self.GUI_open_block, i, j, True))
-                button.grid(row=i, column=j)
-                block_grid[i][j] = button  # 保存至block_grid
+        '''
+        按当前的宽和高布局按钮，返回按钮矩阵。
+        按钮在新游戏之间复用：保留的按钮只重置外观，多余的行列销毁，
+        只为新增的行列创建按钮。
+        '''
+        if self.click_command is None:
+            self.bind_class(  # 双击打开，所有按钮共用一个处理函数
+                self.block_tag, '<Double-Button-1>',
+                self.GUI_block_double_click)
+            self.click_command = self.register(self.GUI_block_click)
+        block_grid = self.block_grid
+        for line in block_grid[self.height:]:  # 销毁多余的行
+            for button in line:
+                self.GUI_destroy_button(button)
+        del block_grid[self.height:]
+        for line in block_grid:
+            for button in line[self.width:]:   # 销毁多余的列
+                self.GUI_destroy_button(button)
+            del line[self.width:]
+            for button in line:                # 重置保留的按钮
+                button.configure(text='', image=self.empty_image)
+        for i in range(self.height):           # 创建新增的按钮
+            if i == len(block_grid):
+                block_grid.append([])
+            for j in range(len(block_grid[i]), self.width):
+                block_grid[i].append(self.GUI_create_button(i, j))
+        self.hint_block = None
+        self.overlay_blocks = []
         return block_grid
 
+    def GUI_create_button(self, i, j):
+        '''创建格子(i, j)的按钮。'''
+        button = tk.Button(
+            self, image=self.empty_image, compound=CENTER,
+            width=30, height=30)
+        path = str(button)
+        button.configure(  # 单击标记为雷
+            command='{} {}'.format(self.click_command, path))
+        button.bindtags(
+            (path, self.block_tag) + button.bindtags()[1:])
+        button.grid(row=i, column=j)
+        self.block_cells[path] = (i, j)
+        return button
+
+    def GUI_destroy_button(self, button):
+        '''销毁不再需要的按钮。'''
+        del self.block_cells[str(button)]
+        button.destroy()
+
+    def GUI_block_click(self, path):
+        '''单击按钮时调用，path为按钮的路径。'''
+        i, j = self.block_cells[path]
+        self.GUI_mark_mine(i, j, istop=True)
+
+    def GUI_block_double_click(self, event):
+        '''双击按钮时调用，自动排雷时还会自动打开格子。'''
+        i, j = self.block_cells[str(event.widget)]
+        self.GUI_open_block(i, j, istop=True, auto_open_block=True)
+
     def GUI_update_cells(self, update_all=False):
         '''
         根据self.grid更新格子。
@@ -267,82 +303,85 @@ class Application(tk.Frame):
                 if update_all and self.grid[i][j][1] == -1:
                     self.block_grid[i][j].configure(  # 更新关闭的格子
                         image=self.empty_image, text='')
-
-    def GUI_auto_open_one_block(self, i, j):
-        '''
-        自动打开已开格子(i, j)周围的可开格子，
-        在self.GUI_auto_open_block()中调用。
-        '''
-        flag = False  # 此轮是否打开了格子
-        block_count, mine_count, opened_block, marked_block \
-            = self.get_around_blocks(i, j)
-        if opened_block + mine_count != block_count \
-                and mine_count == marked_block:
-            for di, dj in self.around_blocks:  # 打开周边格子
-                if self.pos_valid(i + di, j + dj) \
-                        and self.grid[i + di][j + dj][1] != 1:
-                    flag |= self.GUI_open_block(
-                        i + di, j + dj, istop=True,
-                        auto_open_block=False) == 0
-        return flag
+        self.GUI_mark_dirty(*range(self.height))
+        self.changed_blocks = None  # 格子可能整体替换，下次全部重新比较
 
     def GUI_auto_open_block(self):
         '''
-        自动打开格子，格子多时可能效率较低。
-        判断方法为：若某已开格子周围已标记为雷格子数与雷数相等，则打开剩余格子，
-        程序假设用户的标记不出错。
+        自动打开格子。
+        由self.solver推理出一定不是雷的格子并打开，程序假设用户的标记不出错。
         '''
         flag = False  # 是否还可以打开
-        for i in range(self.height):
-            for j in range(self.width):
-                if self.grid[i][j][1] == 0:  # 格子已打开
-                    flag |= self.GUI_auto_open_one_block(i, j)
+        safe, _ = self.solver.deduce(self.grid)
+        for i, j in safe:
+            flag |= self.GUI_open_block(
+                i, j, istop=True, auto_open_block=False, show_hint=False) == 0
         if flag:
             self.GUI_auto_open_block()
 
     def GUI_open_block(
-            self, i, j, istop=False, auto_open_block=False, event=None):
+            self, i, j, istop=False, auto_open_block=False, show_hint=True,
+            event=None):
         '''
         打开格子(i, j)并更新。
         istop :: 是否是顶层函数。避免在打开所有格子时过多的调用。
         auto_open_block :: 是否自动打开格子。
+        show_hint :: 是否更新提示。自动打开的每个格子不更新，只在用户的操作结束后更新一次。
         '''
+        start = time.perf_counter()
         if self.first_click:  # 初次点击判断落点后生成格子
-            self.grid = self.initial_grid(cells=[  # 新棋盘
-                (i + di, j + dj)     # 初次点击点及其周围不能有雷
-                for di, dj in [(0, 0)] + self.around_blocks])
-            self.first_click = False
+            self.generate(i, j)
         state = self.open_block(i, j)  # 打开格子
+        self.modified += 1
         if state == -3:   # 格子标错
             self.block_grid[i][j].configure(image=self.wrong_image)
         elif state == 0:  # 不是雷
-            mine_num = self.grid[i][j][0]     # 获取格子周围雷的数量
-            self.block_grid[i][j].configure(  # 将格子更新为黄色
-                image=self.opened_image, font=('Futura', 25, 'bold'), text='')
-            if mine_num != 0:                     # 周围有雷
-                self.block_grid[i][j].configure(  # 显示雷的数量
-                    text=str(mine_num), foreground=self.colors[mine_num])
-            else:                # 周围没有雷
-                for di, dj in self.around_blocks:  # 打开周围的格子
-                    self.GUI_open_block(i + di, j + dj)
-            if istop and not self.have_won and self.check_end():  # 判断是否成功
-                showinfo('Succeed', 'Win!', parent=self.master)
-                self.have_won = True
+            self.GUI_show_opened(i, j)
+            if self.grid[i][j][0] == 0:  # 周围没有雷，打开整个空白区域
+                for ci, cj in self.open_region(i, j):
+                    self.GUI_show_opened(ci, cj)
         elif state == 1:  # 是雷，失败
             # 将格子更新为雷的图片
             self.block_grid[i][j].configure(image=self.mine_image)
-            if istop:  # 是顶层函数
+            self.GUI_mark_dirty(i)
+            self.GUI_mark_changed(i, j)
+        if istop:  # 是顶层函数，判断胜负，自动标记雷并记录历史
+            self.emit(  # 在弹出对话框之前记录，耗时不包括用户的等待
+                'open', i=i, j=j, state=state,
+                latency=time.perf_counter() - start)
+            if state == 0 and not self.have_won and self.check_end():
+                if self.record.get():  # 未记录时不计算3BV
+                    self.emit('win', bbbv=self.bbbv())
+                showinfo('Succeed', 'Win!', parent=self.master)
+                self.have_won = True
+            elif state == 1:
                 self.GUI_failed()
-        if istop:  # 自动标记雷并记录历史
             if self.auto.get():
+                start = time.perf_counter()
                 self.GUI_auto_mark_mine()
                 if auto_open_block:
                     self.GUI_auto_open_block()
+                self.emit('auto', latency=time.perf_counter() - start)
             self.recent_grids.append(sequence_copy(self.grid))
+            if show_hint:
+                self.GUI_show_hint()
         return state
 
+    def GUI_show_opened(self, i, j):
+        '''将已打开的非雷格子(i, j)更新为黄色，并显示周围雷的数量。'''
+        mine_num = self.grid[i][j][0]     # 获取格子周围雷的数量
+        self.block_grid[i][j].configure(  # 将格子更新为黄色
+            image=self.opened_image, font=('Futura', 25, 'bold'), text='')
+        if mine_num != 0:                     # 周围有雷
+            self.block_grid[i][j].configure(  # 显示雷的数量
+                text=str(mine_num), foreground=self.colors[mine_num])
+        self.GUI_mark_dirty(i)
+        self.GUI_mark_changed(i, j)
+
     def GUI_failed(self):
         '''踩到雷，游戏失败时调用。'''
+        self.emit('loss')
+        self.have_lost = True
         for i in range(self.height):
             for j in range(self.width):
                 # 检查标错的格子
@@ -350,6 +389,8 @@ class Application(tk.Frame):
                     # 将标错的格子设为红色
                     self.block_grid[i][j].configure(image=self.wrong_image)
                     self.grid[i][j][1] = 2
+                    self.GUI_mark_dirty(i)
+                    self.GUI_mark_changed(i, j)
         for i in range(self.height):
             for j in range(self.width):
                 # 下面的调用不是顶层函数
@@ -368,35 +409,178 @@ class Application(tk.Frame):
     def GUI_auto_mark_mine(self):
         '''
         扫描并自动标记格子为雷。
-        判断方法为：若某已开格子周围未开未标记格子数与雷数相等，
-        则标记周围未开未标记格子为雷。
+        由self.solver推理出一定是雷的格子，参见minesolver.PatternSolver。
         '''
-        for i in range(self.height):
-            for j in range(self.width):
-                if self.grid[i][j][1] == 0:  # 格子已打开
-                    block_count, mine_count, opened_block, _ \
-                        = self.get_around_blocks(i, j)
-                    if opened_block + mine_count == block_count:
-                        for di, dj in self.around_blocks:  # 标记周边格子
-                            self.GUI_mark_mine(i + di, j + dj, mark=True)
-
-    def GUI_mark_mine(self, i, j, mark=False):
+        _, mines = self.solver.deduce(self.grid)
+        for i, j in mines:
+            self.GUI_mark_mine(i, j, mark=True)
+
+    def GUI_mark_mine(self, i, j, mark=False, istop=False):
         '''
         标记或取消标记格子(i, j)为雷并更新屏幕。
-        mark=False :: 若为True，则必须标记为雷，而非取消。
+         mark=False :: 若为True，则必须标记为雷，而非取消。
+        istop=False :: 是否是用户直接的操作，是则更新提示并记录事件。
         '''
+        start = time.perf_counter()
         flag = self.mark_mine(i, j, mark)     # 标记为雷
         if flag is not None and flag != 0:    # 是未打开的格子
             self.block_grid[i][j].configure(  # 将格子更新为旗子的图片
                 image=(self.flag_image if flag > 0 else self.empty_image))
+            self.GUI_mark_dirty(i)
+            self.GUI_mark_changed(i, j)
+            self.modified += 1
+        if istop:
+            self.emit(
+                'mark', i=i, j=j, state=flag,
+                latency=time.perf_counter() - start)
         if flag is not None and not self.have_won \
                 and self.check_end():  # 判断是否成功
+            if self.record.get():  # 未记录时不计算3BV
+                self.emit('win', bbbv=self.bbbv())
             showinfo('Succeed', 'Winner!', parent=self.master)
             self.have_won = True
+        if istop:
+            self.GUI_show_hint()
+
+    def GUI_show_hint(self):
+        '''
+        用绿色的点击图标提示最不可能是雷的格子。
+        概率由self.engine计算，只重新计算变化的板块，大棋盘上也能每步更新。
+        '''
+        self.GUI_clear_probabilities()
+        if self.hint_block is not None:  # 清除上次的提示
+            i, j = self.hint_block
+            if self.pos_valid(i, j) and self.grid[i][j][1] == -1:
+                self.block_grid[i][j].configure(image=self.empty_image)
+            self.hint_block = None
+        if not self.hint.get() or self.first_click:
+            return
+        probabilities = self.GUI_probabilities()
+        if probabilities:
+            i, j = min(probabilities, key=probabilities.get)
+            self.block_grid[i][j].configure(image=self.click_image)
+            self.hint_block = (i, j)
+
+    def GUI_mark_changed(self, i, j):
+        '''记录状态变化的格子，计算概率时self.engine只比较这些格子。'''
+        if self.changed_blocks is not None:
+            self.changed_blocks.add((i, j))
+
+    def GUI_probabilities(self):
+        '''由self.engine计算每个未开格子是雷的概率，参见ProbabilityEngine。'''
+        probabilities = self.engine.probabilities(
+            self.grid, self.mine_sum, self.changed_blocks)
+        self.changed_blocks = set()
+        return probabilities
+
+    def GUI_show_probabilities(self, event=None):
+        '''
+        在每个未开格子上显示其是雷的概率（百分数），下一步操作后清除。
+        板块过大时概率由抽样估计，置信区间较宽的格子前加~。
+        '''
+        if self.first_click:
+            return
+        self.GUI_clear_probabilities()
+        probabilities = self.GUI_probabilities()
+        for (i, j), probability in probabilities.items():
+            text = '{:.0f}'.format(probability * 100)
+            if self.engine.errors.get((i, j), 0) >= .005:
+                text = '~' + text
+            self.block_grid[i][j].configure(
+                text=text, font=('Futura', 12), foreground='Black')
+            self.overlay_blocks.append((i, j))
+
+    def GUI_clear_probabilities(self):
+        '''清除self.GUI_show_probabilities()显示的概率。'''
+        for i, j in self.overlay_blocks:
+            if self.pos_valid(i, j) and self.grid[i][j][1] != 0:
+                self.block_grid[i][j].configure(text='')
+        self.overlay_blocks = []
+
+    def GUI_setup_minimap(self):
+        '''
+        在按钮矩阵右侧布置小地图，每个格子对应一个像素（小棋盘时放大）。
+        单击小地图时让对应的按钮获得焦点并闪烁。
+        '''
+        self.minimap_scale = max(
+            1, self.minimap_size // max(self.width, self.height))
+        self.minimap_image = tk.PhotoImage(
+            master=self,
+            width=self.width * self.minimap_scale,
+            height=self.height * self.minimap_scale)
+        if self.minimap_label is None:
+            self.minimap_label = tk.Label(self, borderwidth=0)
+            self.minimap_label.bind('<Button-1>', self.GUI_minimap_click)
+        self.minimap_label.configure(image=self.minimap_image)
+        self.minimap_label.grid(
+            row=0, column=self.width, rowspan=self.height, sticky=N, padx=5)
+        self.minimap_dirty = set()
+        self.GUI_mark_dirty(*range(self.height))
+
+    def GUI_mark_dirty(self, *rows):
+        '''标记小地图中需要重画的行，在空闲时一起重画。'''
+        self.minimap_dirty.update(rows)
+        if self.minimap_job is None and self.minimap_image is not None:
+            self.minimap_job = self.after_idle(self.GUI_update_minimap)
+
+    def GUI_minimap_color(self, block_mine, block_state):
+        '''小地图中格子的颜色。'''
+        if block_state == 1:
+            return self.minimap_colors['flag']
+        elif block_state == 2:
+            return self.minimap_colors['wrong']
+        elif block_state == 0:
+            return self.minimap_colors[
+                'mine' if block_mine == -1 else 'opened']
+        return self.minimap_colors['unknown']
+
+    def GUI_update_minimap(self):
+        '''
+        重画小地图中标记过的行。
+        每段连续的行只调用一次PhotoImage.put()，不会对每个格子分别调用。
+        '''
+        self.minimap_job = None
+        rows = sorted(row for row in self.minimap_dirty if row < self.height)
+        self.minimap_dirty = set()
+        scale = self.minimap_scale
+        start = 0
+        while start < len(rows):
+            end = start  # 找出一段连续的行
+            while end + 1 < len(rows) and rows[end + 1] == rows[end] + 1:
+                end += 1
+            lines = []
+            for i in rows[start:end + 1]:
+                if self.first_click:  # 初次点击前棋盘尚未生成
+                    colors = [self.minimap_colors['unknown']] * self.width
+                else:
+                    colors = [
+                        self.GUI_minimap_color(*block)
+                        for block in self.grid[i]]
+                line = '{' + ' '.join(
+                    color for color in colors for _ in range(scale)) + '}'
+                lines.extend([line] * scale)
+            self.minimap_image.put(
+                ' '.join(lines), to=(0, rows[start] * scale))
+            start = end + 1
+
+    def GUI_minimap_click(self, event):
+        '''单击小地图时，让对应的按钮获得焦点并闪烁。'''
+        i = event.y // self.minimap_scale
+        j = event.x // self.minimap_scale
+        if self.pos_valid(i, j):
+            self.block_grid[i][j].focus_set()
+            self.block_grid[i][j].flash()
 
     def GUI_undo(self, event=None):
         '''撤销打开格子的操作，其间标记雷的操作将同时撤销。'''
         if len(self.recent_grids) > 1:
+            start = time.perf_counter()
             self.recent_grids.pop()
             self.grid = sequence_copy(self.recent_grids[-1])
+            self.have_won = self.have_lost = False  # 撤销后游戏继续
+            self.modified += 1
             self.GUI_update_cells(update_all=True)
+            self.GUI_show_hint()
+            self.emit(
+                'undo', steps=len(self.recent_grids),
+                latency=time.perf_counter() - start)
@@ -0,0 +1,410 @@
+'''
+Mine Sweeper -- mineterm.py
+Copyright(c) 2024 Liu One  All rights reserved.
+
+终端中的扫雷，基于curses，不依赖tkinter，详情参见Terminal。
+可以通过SSH在无法启动Tk的机器上玩，操作与main.py的菜单相同。
+格子数很多时使用minesparse.SparseBoard，也可以用来玩或调试超大的棋盘，
+空白区域只在视野附近填充，首次点击不必打开几乎整个棋盘。
+
+用法：python mineterm.py [mboard文件] [--width 30 --height 16 --density .2]
+'''
+
+import curses
+import argparse
+
+from mineboard import MineBoard
+from minesparse import SparseBoard
+
+HELP = (
+    'arrows/hjkl: move  HJKL: page  o/space: open  f/m: mark  r: retry  '
+    'n: new game  s: save  u: undo  a: auto mine  q: quit')
+
+
+def copy_grid(grid):
+    '''复制格子矩阵，用于撤销。'''
+    return [[block[:] for block in line] for line in grid]
+
+
+class Terminal:
+    '''
+    终端界面。
+    用例：
+    curses.wrapper(lambda screen: Terminal(screen, 30, 16, 99).run())
+    每个格子占两列：.未打开，F标记为雷，数字为周围雷的数量，*为雷，X为标错的格子。
+    只重画变化的格子，视野移动或窗口大小改变时才重画整个屏幕。
+    '''
+    sparse_cells = 250000  # 格子数超过此值时使用稀疏的棋盘
+    moves = {  # 按键对应的光标移动，大写字母移动一屏
+        curses.KEY_UP: (-1, 0), curses.KEY_DOWN: (1, 0),
+        curses.KEY_LEFT: (0, -1), curses.KEY_RIGHT: (0, 1),
+        ord('k'): (-1, 0), ord('j'): (1, 0),
+        ord('h'): (0, -1), ord('l'): (0, 1)}
+    pages = {
+        ord('K'): (-1, 0), ord('J'): (1, 0),
+        ord('H'): (0, -1), ord('L'): (0, 1)}
+
+    def __init__(self, screen, width, height, mine_sum, filename=None):
+        '''
+                     screen :: curses的窗口。
+        width, height, mine_sum :: 棋盘的宽、高和雷数。
+              filename=None :: mboard文件名，给出则打开文件。
+        '''
+        self.screen = screen
+        self.board = None
+        self.history = []         # 历史记录，用于撤销操作
+        self.auto = False         # 是否自动排雷
+        self.solver = None        # 自动排雷的推理程序，第一次使用时才加载
+        self.cursor = (0, 0)      # 光标所在的格子
+        self.top = self.left = 0  # 视野左上角的格子
+        self.dirty = set()        # 需要重画的格子
+        self.full = True          # 是否重画整个屏幕
+        self.lost = False         # 是否踩到雷
+        self.over = False         # 游戏是否结束
+        self.message = HELP       # 状态栏的信息
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass  # 终端不支持隐藏光标
+        if curses.has_colors() and curses.COLOR_PAIRS > 8:
+            curses.use_default_colors()
+            for number, color in enumerate((
+                    curses.COLOR_BLUE, curses.COLOR_GREEN, curses.COLOR_RED,
+                    curses.COLOR_BLUE, curses.COLOR_RED, curses.COLOR_MAGENTA,
+                    curses.COLOR_CYAN, curses.COLOR_WHITE), 1):
+                curses.init_pair(number, color, -1)
+        self.start(width, height, mine_sum, filename)
+
+    @property
+    def sparse(self):
+        '''当前棋盘是否是稀疏的棋盘。'''
+        return isinstance(self.board, SparseBoard)
+
+    def start(self, width, height, mine_sum, filename=None):
+        '''开始新游戏，给出filename时打开mboard文件。'''
+        if filename is not None:
+            board = MineBoard(0, 0, 0)
+            board.width, board.height, board.mine_sum, board.grid \
+                = board.open_board(filename)
+            board.first_click = False  # 棋盘已生成
+        elif width < 1 or height < 1 or not 0 <= mine_sum \
+                <= width * height - min(height, 3) * min(width, 3):
+            raise ValueError('too many mines for the board')
+        elif width * height > self.sparse_cells:
+            board = SparseBoard(width, height, mine_sum)
+        else:
+            board = MineBoard(width, height, mine_sum)
+        self.board = board
+        if self.sparse:  # 推理程序逐个格子读取，不能用于稀疏的棋盘
+            self.auto = False
+        self.history = [] if board.first_click else [copy_grid(board.grid)]
+        self.cursor = (board.height // 2, board.width // 2)
+        self.lost = self.over = False
+        self.full = True
+
+    def changed(self, opened):
+        '''
+        标记需要重画的格子。
+        opened :: MineBoard.reveal()返回的格子列表，
+                  或SparseBoard.reveal()返回的范围(上, 左, 下, 右)。
+        '''
+        if isinstance(opened, tuple):  # 只重画范围中可见的部分
+            top, left, bottom, right = opened
+            rows, cols = self.view_size()
+            for i in range(
+                    max(top, self.top), min(bottom + 1, self.top + rows)):
+                for j in range(
+                        max(left, self.left),
+                        min(right + 1, self.left + cols)):
+                    self.dirty.add((i, j))
+        elif opened:
+            self.dirty.update(opened)
+
+    def open(self):
+        '''打开光标所在的格子，周围没有雷时打开整个空白区域。'''
+        if self.over:
+            return
+        state, opened = self.board.reveal(*self.cursor)
+        self.changed(opened)
+        if state == 0 and self.auto:
+            state = self.auto_mine()
+        if state not in (0, 1):
+            return
+        if not self.sparse:
+            self.history.append(copy_grid(self.board.grid))
+        if state == 1:  # 踩到雷
+            self.lost = self.over = self.full = True
+            self.message = 'Boom! r: retry  n: new game  u: undo  q: quit'
+        else:
+            self.check()
+
+    def mark(self):
+        '''标记或取消标记光标所在的格子为雷。'''
+        if not self.over and self.board.mark_mine(*self.cursor) is not None:
+            self.dirty.add(self.cursor)
+            self.check()
+
+    def check(self):
+        '''判断是否胜利。'''
+        if self.board.check_end():
+            self.over = True
+            self.message = 'Win! r: retry  n: new game  q: quit'
+
+    def auto_mine(self):
+        '''
+        自动标记推理出的雷并打开推理出的非雷格子，直到推不出结果。
+        return :: 最后一次打开格子的状态，踩到雷时为1。
+        '''
+        if self.solver is None:  # 推迟加载，终端启动更快
+            from minesolver import PatternSolver, PatternCache
+            self.solver = PatternSolver(PatternCache.load())
+        while True:
+            safe, mines = self.solver.deduce(self.board.grid)
+            for i, j in mines:
+                self.board.mark_mine(i, j, mark=True)
+                self.dirty.add((i, j))
+            if not safe:
+                return 0
+            for i, j in safe:
+                state, opened = self.board.reveal(i, j)
+                self.changed(opened)
+                if state == 1:  # 用户标错时可能踩到雷
+                    return state
+
+    def toggle_auto(self):
+        '''切换是否自动排雷。'''
+        if self.sparse:
+            self.message = 'Auto mine is not available on sparse boards.'
+            return
+        self.auto = not self.auto
+        self.message = 'Auto mine on.' if self.auto else 'Auto mine off.'
+
+    def retry(self):
+        '''重新尝试同一棋盘，光标移到合适的首次点击点。'''
+        board = self.board
+        if board.first_click:
+            return
+        if self.sparse:
+            board.grid.close_all()
+        else:
+            for line in board.grid:
+                for block in line:
+                    block[1] = -1  # 关闭格子
+            self.history = [copy_grid(board.grid)]
+        for i in range(board.height):
+            j = next((
+                j for j in range(board.width) if board.grid[i][j][0] == 0),
+                None)
+            if j is not None:
+                self.cursor = (i, j)
+                break
+        self.lost = self.over = False
+        self.full = True
+        self.message = HELP
+
+    def undo(self):
+        '''撤销打开格子的操作，其间标记雷的操作将同时撤销。'''
+        if self.sparse:
+            self.message = 'Undo is not available on sparse boards.'
+        elif len(self.history) > 1:
+            self.history.pop()
+            self.board.grid = copy_grid(self.history[-1])
+            self.lost = self.over = False
+            self.full = True
+            self.message = HELP
+
+    def new_game(self):
+        '''询问宽、高和雷密度，或mboard文件，然后开始新游戏。'''
+        board = self.board
+        answer = self.prompt(
+            'New game: width height density, or an .mboard file'
+            ' [{} {} {:.2f}]: '.format(
+                board.width, board.height,
+                board.mine_sum / (board.width * board.height)))
+        try:
+            if len(answer.split()) == 1:
+                self.start(0, 0, 0, filename=answer)
+            else:
+                width, height, density = answer.split() or (
+                    board.width, board.height,
+                    board.mine_sum / (board.width * board.height))
+                width, height = int(width), int(height)
+                self.start(width, height, int(float(density) * width * height))
+            self.message = HELP
+        except (OSError, ValueError, IndexError) as error:
+            self.message = 'Cannot start the game: {}'.format(error)
+
+    def save_board(self):
+        '''保存棋盘为mboard文件。'''
+        if self.sparse:
+            self.message = 'Sparse boards are too large to save.'
+            return
+        if self.board.first_click:
+            self.message = 'Open a block before saving the board.'
+            return
+        filename = self.prompt('Save board as: ')
+        if not filename:
+            return
+        try:
+            with open(filename, 'w') as file:
+                self.board.write_board(file)
+            self.message = 'Saved to {}.'.format(filename)
+        except OSError as error:
+            self.message = 'Cannot save the board: {}'.format(error)
+
+    def prompt(self, text):
+        '''在状态栏询问一行文字。'''
+        rows, cols = self.screen.getmaxyx()
+        self.screen.move(rows - 1, 0)
+        self.screen.clrtoeol()
+        self.screen.addnstr(rows - 1, 0, text, cols - 1)
+        curses.echo()
+        try:
+            curses.curs_set(1)
+        except curses.error:
+            pass
+        try:
+            answer = self.screen.getstr(
+                rows - 1, min(len(text), cols - 1)).decode(errors='replace')
+        finally:
+            curses.noecho()
+            try:
+                curses.curs_set(0)
+            except curses.error:
+                pass
+        self.full = True
+        return answer.strip()
+
+    def move(self, di, dj):
+        '''移动光标。'''
+        i, j = self.cursor
+        self.dirty.add(self.cursor)
+        self.cursor = (
+            min(max(i + di, 0), self.board.height - 1),
+            min(max(j + dj, 0), self.board.width - 1))
+        self.dirty.add(self.cursor)
+
+    def view_size(self):
+        '''视野中格子的行数和列数，最后一行是状态栏。'''
+        rows, cols = self.screen.getmaxyx()
+        return max(rows - 1, 1), max(cols // 2, 1)
+
+    def scroll(self):
+        '''
+        光标移出视野时移动视野，使光标位于中间。
+        稀疏的棋盘只填充视野及其周围一屏内的空白区域，视野移动后继续填充。
+        '''
+        rows, cols = self.view_size()
+        i, j = self.cursor
+        if not self.top <= i < self.top + rows:
+            self.top = max(i - rows // 2, 0)
+            self.full = True
+        if not self.left <= j < self.left + cols:
+            self.left = max(j - cols // 2, 0)
+            self.full = True
+        if self.sparse:
+            self.board.window = (
+                self.top - rows, self.left - cols,
+                self.top + 2 * rows - 1, self.left + 2 * cols - 1)
+            if not self.board.first_click:
+                self.changed(self.board.fill())
+
+    def cell(self, i, j):
+        '''格子(i, j)显示的字符和属性。'''
+        if self.board.first_click:  # 初次点击前棋盘尚未生成
+            return '.', curses.A_DIM
+        block_mine, block_state = self.board.grid[i][j]
+        if block_state == 0:
+            if block_mine == -1:
+                return '*', curses.A_BOLD | curses.color_pair(3)
+            elif block_mine == 0:
+                return ' ', curses.A_NORMAL
+            return str(block_mine), curses.color_pair(block_mine)
+        elif block_state == 2 or block_state == 1 and self.lost \
+                and block_mine != -1:
+            return 'X', curses.A_BOLD
+        elif block_state == 1:
+            return 'F', curses.A_BOLD | curses.color_pair(3)
+        elif self.lost and block_mine == -1:
+            return '*', curses.A_NORMAL
+        return '.', curses.A_DIM
+
+    def draw(self):
+        '''重画变化的格子和状态栏。'''
+        rows, cols = self.view_size()
+        if self.full:
+            self.screen.erase()
+            cells = [
+                (i, j)
+                for i in range(
+                    self.top, min(self.top + rows, self.board.height))
+                for j in range(
+                    self.left, min(self.left + cols, self.board.width))]
+        else:
+            cells = [
+                (i, j) for i, j in self.dirty
+                if self.top <= i < self.top + rows
+                and self.left <= j < self.left + cols]
+        for i, j in cells:
+            text, attr = self.cell(i, j)
+            if (i, j) == self.cursor:
+                attr |= curses.A_REVERSE
+            self.screen.addstr(i - self.top, (j - self.left) * 2, text, attr)
+        self.full = False
+        self.dirty = set()
+        status = '({}, {}) {}x{} {} mines{}  {}'.format(
+            *self.cursor, self.board.width, self.board.height,
+            self.board.mine_sum, '  auto' if self.auto else '', self.message)
+        self.screen.move(rows, 0)
+        self.screen.clrtoeol()
+        self.screen.addnstr(
+            rows, 0, status, self.screen.getmaxyx()[1] - 1)
+        self.screen.refresh()
+
+    def run(self):
+        '''主循环，按q退出。'''
+        actions = {
+            ord('o'): self.open, ord(' '): self.open,
+            ord('f'): self.mark, ord('m'): self.mark,
+            ord('r'): self.retry, ord('n'): self.new_game,
+            ord('s'): self.save_board, ord('u'): self.undo,
+            ord('a'): self.toggle_auto}
+        while True:
+            self.scroll()
+            self.draw()
+            key = self.screen.getch()
+            if key == ord('q'):
+                break
+            elif key == curses.KEY_RESIZE:
+                self.full = True
+            elif key in self.moves:
+                self.move(*self.moves[key])
+            elif key in self.pages:
+                rows, cols = self.view_size()
+                di, dj = self.pages[key]
+                self.move(di * rows, dj * cols)
+            elif key in actions:
+                actions[key]()
+        if self.solver is not None:
+            try:
+                self.solver.cache.save()  # 保存图案库，供以后的游戏使用
+            except OSError:
+                pass
+
+
+def main():
+    '''命令行入口。'''
+    parser = argparse.ArgumentParser(
+        description='Play Mine Sweeper in the terminal.')
+    parser.add_argument('filename', nargs='?')
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--height', type=int, default=16)
+    parser.add_argument('--density', type=float, default=.2)
+    args = parser.parse_args()
+    mine_sum = int(args.density * args.width * args.height)
+    curses.wrapper(lambda screen: Terminal(
+        screen, args.width, args.height, mine_sum, args.filename).run())
+
+
+if __name__ == '__main__':
+    main()
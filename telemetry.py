@@ -0,0 +1,110 @@
+'''
+Mine Sweeper -- telemetry.py
+Copyright(c) 2024 Liu One  All rights reserved.
+
+可选的游戏事件记录，详情参见Telemetry。
+每个事件是一行JSON，文件超过一定大小时轮换为telemetry.jsonl.1、.2……
+事件先放入有界的内存队列，由后台线程写入，界面线程不会因读写文件而阻塞。
+'''
+
+import os
+import json
+import time
+import queue
+import pathlib
+import threading
+
+TELEMETRY_PATH = pathlib.Path.home() / '.minesweeper' / 'telemetry.jsonl'
+
+
+class Telemetry:
+    '''
+    事件记录。
+    用例：
+    telemetry = Telemetry()
+    telemetry.emit('open', i=3, j=4, latency=0.002)  # 立即返回
+    telemetry.stop()  # 写完队列中的事件后结束线程
+    队列已满时丢弃新事件并计数，下一次写入时记录丢弃的数量。
+    '''
+
+    def __init__(
+            self, path=TELEMETRY_PATH,
+            max_bytes=5 * 1024 * 1024, backups=3, maxsize=4096):
+        '''
+             path :: 记录文件的路径。
+        max_bytes :: 文件超过此大小时轮换。
+          backups :: 保留的旧文件数。
+          maxsize :: 内存队列最多容纳的事件数。
+        '''
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.events = queue.Queue(maxsize=maxsize)
+        self.dropped = 0  # 因队列已满而丢弃的事件数
+        self.dropped_lock = threading.Lock()  # 两个线程都会修改self.dropped
+        self.thread = None
+
+    def emit(self, event, **fields):
+        '''记录一个事件，立即返回。第一次调用时启动后台线程。'''
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        fields['event'] = event
+        fields['time'] = time.time()
+        try:
+            self.events.put_nowait(fields)
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped += 1
+
+    def stop(self):
+        '''写完队列中的事件并结束后台线程。'''
+        if self.thread is not None:
+            self.events.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def rotate(self):
+        '''轮换记录文件：.2改为.3，.1改为.2，当前文件改为.1。'''
+        for k in range(self.backups - 1, 0, -1):
+            older = self.path.with_name('{}.{}'.format(self.path.name, k))
+            if older.exists():
+                os.replace(
+                    older, self.path.with_name(
+                        '{}.{}'.format(self.path.name, k + 1)))
+        if self.backups > 0:
+            os.replace(
+                self.path, self.path.with_name(self.path.name + '.1'))
+        else:
+            self.path.unlink()
+
+    def run(self):
+        '''后台线程的主循环，一次取出队列中所有的事件一起写入。'''
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            batch = [self.events.get()]
+            while True:
+                try:
+                    batch.append(self.events.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [
+                json.dumps(fields, separators=(',', ':')) + '\n'
+                for fields in batch if fields is not None]
+            with self.dropped_lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                lines.append(json.dumps({
+                    'event': 'dropped', 'time': time.time(),
+                    'count': dropped}, separators=(',', ':')) + '\n')
+            try:
+                with open(self.path, 'a') as file:
+                    file.writelines(lines)
+                    size = file.tell()
+                if size > self.max_bytes:
+                    self.rotate()
+            except OSError:
+                pass  # 记录失败不影响游戏
+            if stop:
+                return
@@ -28,6 +28,8 @@ def ask_settings(root):
             {'initialvalue': .25, 'minvalue': 0, 'maxvalue': 1}),
         ('MBoard File', 'file',
             {'filetypes': [("Mine Sweeper's Mine Board", '*.mboard')],
-             'required': False}))
+             'required': False}),
+        ('From Library', list,  # 从棋盘库中挑选，参见minelibrary.py
+            {'choices': ['No', 'Any board', 'No-guess board']}))
     root.deiconify()  # 显示
     return dialog.outputs